@@ -1,7 +1,38 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from Resources import Resource
+from Assets import assets
+from Assets import tiles
+from Assets import FONT
+from Frames import JpegFrames
 import Auxilary
 from Auxilary import cr_line_len
+from Auxilary import s2r
+from Events import Sink
+from Events import TurnStarted
+from Events import DiceThrown
+from Events import ActionApplied
+from Events import ResourcesChanged
+
+
+# ---- global variables ---- #
+
+PROFILES = ['images/source/shay_profile.JPG',
+            'images/source/snow_profile.JPG',
+            'images/source/shaked_profile.JPG',
+            'images/source/odeya_profile.JPG']
+RESOURCE_IMAGES = {Resource.CLAY: 'images/source/mini clay.JPG',
+                   Resource.WOOD: 'images/source/mini wood.JPG',
+                   Resource.SHEEP: 'images/source/mini sheep.JPG',
+                   Resource.WHEAT: 'images/source/mini wheat.JPG',
+                   Resource.IRON: 'images/source/mini iron.JPG'}
+LAND_SIZE = (246, 287)
+PROFILE_SIZE = (111, 94)
+NUMBER_SIZE = (100, int(188 * 100 / 223))
+# the part of the canvas covered by the terrain (5 lines of at most 5 lands of 245 x 213, plus the last land bottom)
+TERRAIN_BOX = (965, 768, 965 + 5 * 245 + 1, 768 + 4 * (142 + 71) + 287)
+
+
+# ---- functions ---- #
 
 
 def resize_road(percent, location):
@@ -17,16 +48,12 @@ def create_land_numbers():
     land_nums = {}
     for i in range(2, 13):
         if i != 7:
-            land_nums[i] = Image.open('images/source/number' + str(i) + '.JPG')
+            land_nums[i] = assets.get('images/source/number' + str(i) + '.JPG')
     return land_nums
 
 
 def create_profiles() -> list[Image]:
-    profiles = [Image.open('images/source/shay_profile.JPG'),
-                Image.open('images/source/snow_profile.JPG'),
-                Image.open('images/source/shaked_profile.JPG'),
-                Image.open('images/source/odeya_profile.JPG')]
-    return profiles
+    return [assets.get(path) for path in PROFILES]
 
 
 def resize_img(path, size):
@@ -43,48 +70,46 @@ def resize_arrows(size):
 
 
 class API:
-    def __init__(self, names: list[str]):
+    # frames is where the saved frames go, one jpeg per frame by default (see Frames)
+    def __init__(self, names: list[str], save_frames=True, frames=None):
         self.on_switch = True
         if self.on_switch:
-            self.times = Image.open('images/source/times.png')
-            self.times_mask = Image.open('images/source/times_mask.png').convert('L')
-            self.give = Image.open('images/source/give.png')
-            self.take = Image.open('images/source/take.png')
-            self.give_mask = Image.open('images/source/give_mask.png').convert('L')
-            self.take_mask = Image.open('images/source/take_mask.png').convert('L')
+            self.times = assets.get('images/source/times.png')
+            self.times_mask = assets.get('images/source/times_mask.png', mode='L')
+            self.give = assets.get('images/source/give.png')
+            self.take = assets.get('images/source/take.png')
+            self.give_mask = assets.get('images/source/give_mask.png', mode='L')
+            self.take_mask = assets.get('images/source/take_mask.png', mode='L')
             self.tester_on = False
             self.names = names
             self.round = 0
             self.turn = 0
             self.action = 0
             self.num_of_players = len(names)
-            self.start = Image.open('images/source/start.jpg')
+            self.start = assets.get('images/source/start.jpg').copy()
             self.headline_y = 480
             self.font_size = 48
-            self.font = ImageFont.truetype('Library/Fonts/Arial Bold.ttf', self.font_size)
+            self.font = assets.font(FONT, self.font_size)
             self.draw = ImageDraw.Draw(self.start)
-            self.action_img = Image.open('images/source/action.JPG')
+            self.action_img = assets.get('images/source/action.JPG')
             self.action_location = (int((3160 - self.action_img.size[0]) / 2), 30)
-            self.do_i_save_copy = False
+            self.save_frames = save_frames  # off while a render worker catches up (see Events.AsyncSink)
+            self.frames = frames if frames is not None else JpegFrames()
             self.profiles = create_profiles()
             self.settlements = self.create_settlements()
             self.cities = self.create_cities()
-            self.settlement_mask = Image.open('images/source/settlement_mask.png').convert('L')
-            self.action_mask = Image.open('images/source/red mask.JPG').resize((1520, 440))
-            self.headline_mask = Image.open('images/source/red mask.JPG').resize((250, 140))
+            self.settlement_mask = assets.get('images/source/settlement_mask.png', mode='L')
+            self.action_mask = assets.get('images/source/red mask.JPG', (1520, 440))
+            self.headline_mask = assets.get('images/source/red mask.JPG', (250, 140))
             self.dice = []
             for i in range(1, 7):
-                self.dice += [Image.open('images/source/die' + str(i) + '.jpg')]
+                self.dice += [assets.get('images/source/die' + str(i) + '.jpg')]
             self.print_profiles()
             self.resource_locations = []
-            self.resources = {Resource.CLAY: Image.open('images/source/mini clay.JPG'),
-                              Resource.WOOD: Image.open('images/source/mini wood.JPG'),
-                              Resource.SHEEP: Image.open('images/source/mini sheep.JPG'),
-                              Resource.WHEAT: Image.open('images/source/mini wheat.JPG'),
-                              Resource.IRON: Image.open('images/source/mini iron.JPG')}
+            self.resources = {resource: assets.get(path) for resource, path in RESOURCE_IMAGES.items()}
             self.print_resources_imgs()
-            self.resource_img = Image.open('images/source/resource.png')
-            self.resource_mask = Image.open('images/source/resource_mask.png').convert('L')
+            self.resource_img = assets.get('images/source/resource.png')
+            self.resource_mask = assets.get('images/source/resource_mask.png', mode='L')
             self.new_turn()
             self.cr_size_w, self.cr_size_h = self.settlement_mask.size
             self.land_w = 245
@@ -92,18 +117,18 @@ class API:
             self.land_hat_h = 71
             self.crossroad_start_x = 965 + self.land_w * 1.5 - self.cr_size_w / 2
             self.crossroad_start_y = 765 - self.land_mid_h - self.cr_size_h / 2
-            self.copy = None  # type: Image
+            self.highlight = None  # the box under the highlight circle and what it covered, see point_with_circle
             self.crossroads = self.set_crossroads_locations()
             self.colors = [(254, 242, 0), (0, 163, 232), (239, 227, 175), (255, 127, 38)]
-            self.lands_imgs = {Resource.CLAY: Image.open('images/source/clay land.JPG').resize((246, 287)),
-                               Resource.WOOD: Image.open('images/source/wood land.JPG').resize((246, 287)),
-                               Resource.SHEEP: Image.open('images/source/sheep land.JPG').resize((246, 287)),
-                               Resource.WHEAT: Image.open('images/source/wheat land.JPG').resize((246, 287)),
-                               Resource.IRON: Image.open('images/source/iron land.JPG').resize((246, 287)),
-                               Resource.DESSERT: Image.open('images/source/dessert.JPG').resize((246, 287))}
-            self.land_mask = Image.open('images/source/land_mask.JPG').resize((246, 287)).convert('L')
+            self.lands_imgs = {Resource.CLAY: assets.get('images/source/clay land.JPG', LAND_SIZE),
+                               Resource.WOOD: assets.get('images/source/wood land.JPG', LAND_SIZE),
+                               Resource.SHEEP: assets.get('images/source/sheep land.JPG', LAND_SIZE),
+                               Resource.WHEAT: assets.get('images/source/wheat land.JPG', LAND_SIZE),
+                               Resource.IRON: assets.get('images/source/iron land.JPG', LAND_SIZE),
+                               Resource.DESSERT: assets.get('images/source/dessert.JPG', LAND_SIZE)}
+            self.land_mask = assets.get('images/source/land_mask.JPG', LAND_SIZE, 'L')
             self.land_nums = create_land_numbers()
-            self.number_mask = Image.open('images/source/number_mask.jpg').convert('L')
+            self.number_mask = assets.get('images/source/number_mask.jpg', mode='L')
 
     def write_a_note(self, text):
         if self.on_switch:
@@ -116,12 +141,13 @@ class API:
         if self.on_switch:
             self.tester_on = True
             if buyer == self.num_of_players:
-                buyer_img = Image.open('images/source/bank.jpg').resize((111, 94))
+                buyer_img = assets.get('images/source/bank.jpg', PROFILE_SIZE)
             else:
-                buyer_img = self.profiles[buyer].resize((111, 94))
-            seller_img = self.profiles[seller].resize((111, 94))
+                buyer_img = assets.get(PROFILES[buyer], PROFILE_SIZE)
+            seller_img = assets.get(PROFILES[seller], PROFILE_SIZE)
             p_w, p_h = seller_img.size
             action_img, y = self.get_action("trade")
+            action_img = action_img.copy()
             w, h = action_img.size
             a_w, a_h = self.give.size
             action_img.paste(seller_img, (100, 110 + int((140 - p_h) / 2)))
@@ -135,9 +161,9 @@ class API:
             self.start.paste(action_img, self.action_location)
 
     def print_trade_info(self, left, arrow, resource, number):
-        resource_number = self.get_resource_number(number).resize((100, int(188 * 100 / 223)))
-        number_mask = self.resource_mask.resize((100, int(188 * 100 / 223)))
-        resource_img = self.resources[resource].resize((70, 60))
+        resource_number = self.get_resource_number(number).resize(NUMBER_SIZE)
+        number_mask = assets.get('images/source/resource_mask.png', NUMBER_SIZE, 'L')
+        resource_img = assets.get(RESOURCE_IMAGES[resource], (70, 60))
         r_w, r_h = resource_img.size
         t_w, t_h = self.times.size
         n_w, n_h = resource_number.size
@@ -172,14 +198,14 @@ class API:
         settlements = []
         for i in range(self.num_of_players):
             name = 'images/source/settlement' + str(i + 1) + '.png'
-            settlements += [Image.open(name).convert("RGBA")]
+            settlements += [assets.get(name, mode='RGBA')]
         return settlements
 
     def create_cities(self):
         cities = []
         for i in range(self.num_of_players):
             name = 'images/source/city' + str(i + 1) + '.png'
-            cities += [Image.open(name).convert("RGBA")]
+            cities += [assets.get(name, mode='RGBA')]
         return cities
 
     def new_turn(self):
@@ -204,14 +230,11 @@ class API:
 
     def save_file(self):
         if self.on_switch:
-            name = "images/destination/round " + str(self.round) + "  turn " + \
-                   str(self.turn) + "  action " + str(self.action) + ".jpg"
-            if self.do_i_save_copy:
-                self.copy.save(name)
-                self.do_i_save_copy = False
-            else:
-                self.start.save(name)
-            self.action += 1
+            if self.save_frames:
+                name = "round " + str(self.round) + "  turn " + str(self.turn) + "  action " + str(self.action)
+                self.frames.write(name, self.start)
+                self.action += 1
+            self.clear_highlight()
 
     def delete_turn(self):
         w, h = self.headline_mask.size
@@ -273,13 +296,17 @@ class API:
         if self.on_switch:
             self.start.paste(self.get_action(action_name)[0], self.action_location)
 
+    # the banner is shared by every frame, copy it before drawing on it
     def get_action(self, action_name) -> (Image, int):
+        return tiles.get(('action', action_name, FONT, 60), lambda: self.render_action(action_name))
+
+    def render_action(self, action_name) -> (Image, int):
         copy = self.action_img.copy()
         # 1577 - 2333 = 756 * 2 = 1512
         # 443 -25 =~ 420
         w, h = copy.size
         draw = ImageDraw.Draw(copy)
-        font = ImageFont.truetype('Library/Fonts/Arial Bold.ttf', 60)
+        font = assets.font(FONT, 60)
         w_t, h_t = self.draw.textsize(action_name, font=font)
         draw.multiline_text(((w - w_t) / 2, 70), action_name, fill=(0, 0, 0), font=font)
         return copy, 70 + h_t
@@ -319,11 +346,20 @@ class API:
         x1, y1 = self.get_crossroad_location(i1, j1)
         return x0, y0, x1, y1
 
+    # the circle is only part of the next saved frame: the small box it covers is kept and pasted back after the save,
+    # instead of drawing it on a copy of the whole canvas
     def point_with_circle(self, x, y, size):
-        self.copy = self.start.copy()
-        draw = ImageDraw.Draw(self.copy)
+        self.clear_highlight()
+        box = (int(x - size) - 1, int(y - size) - 1, int(x + size) + 2, int(y + size) + 2)
+        self.highlight = (box, self.start.crop(box))
+        draw = self.draw
         draw.ellipse((x - size, y - size, x + size, y + size), outline=(255, 0, 0, 0), width=10)
-        self.do_i_save_copy = True
+
+    def clear_highlight(self):
+        if self.highlight is not None:
+            box, covered = self.highlight
+            self.start.paste(covered, box[:2])
+            self.highlight = None
 
     def point_on_crossroad(self, i, j):
         if self.on_switch:
@@ -353,38 +389,115 @@ class API:
         if self.on_switch:
             for r in resources:
                 copy = self.get_resource_number(resources[r])
-                if self.do_i_save_copy:
-                    self.copy.paste(copy, self.resource_locations[index][r], self.resource_mask)
                 self.start.paste(copy, self.resource_locations[index][r], self.resource_mask)
 
+    # the tile is shared by every frame, copy it before drawing on it
     def get_resource_number(self, number):
+        return tiles.get(('number', str(number), FONT, 60), lambda: self.render_resource_number(number))
+
+    def render_resource_number(self, number):
         w, h = self.resource_img.size
         copy = self.resource_img.copy()
         draw = ImageDraw.Draw(copy)
-        font = ImageFont.truetype('Library/Fonts/Arial Bold.ttf', 60)
+        font = assets.font(FONT, 60)
         w_t, h_t = self.draw.textsize(str(number), font=font)
         draw.multiline_text(((w - w_t) / 2, (h - h_t) / 2), str(number), fill=(0, 0, 0), font=font)
         return copy
 
+    # draw the pieces and resources of a position (see Render.checkpoint) on a canvas that only has the terrain
+    def draw_position(self, position):
+        for player, i, j, building in position['crossroads']:
+            if building == 2:
+                self.print_city(player, i, j)
+            else:
+                self.print_settlement(player, i, j)
+        for player, i0, j0, i1, j1 in position['roads']:
+            self.print_road(player, i0, j0, i1, j1)
+        for player, resources in enumerate(position['resources']):
+            self.print_resources(player, resources)
+
+    # the terrain is drawn once per map layout (in this process) on its own layer, which is then pasted in one go
     def show_terrain(self, lands):
         if self.on_switch:
-            # setting the y location of the start of the terrain
-            y = 768
-            # printing the terrain
-            for i, line in enumerate(lands):
-                x = 965
-                if i == 0 or i == 4:
-                    x += self.land_w
-                if i == 1 or i == 3:
-                    x += self.land_w / 2
-                for land in line:
-                    land_img = self.lands_imgs[land.resource].copy()
-                    if land.num != 7:
-                        print("\n\n")
-                        print(self.land_nums[land.num].size)
-                        print(self.number_mask.size)
-                        land_img.paste(self.land_nums[land.num], (83, 104), self.number_mask)
-                    self.start.paste(land_img, (int(x), int(y)), self.land_mask)
-                    x += self.land_w
-                y += (self.land_mid_h + self.land_hat_h)
+            layout = tuple((land.resource, land.num) for line in lands for land in line)
+            self.start.paste(tiles.get(('terrain', layout), lambda: self.render_terrain(lands)), TERRAIN_BOX[:2])
             self.save_file()
+
+    def render_terrain(self, lands):
+        left, top = TERRAIN_BOX[:2]
+        layer = self.start.crop(TERRAIN_BOX)
+        # setting the y location of the start of the terrain
+        y = 768
+        # printing the terrain
+        for i, line in enumerate(lands):
+            x = 965
+            if i == 0 or i == 4:
+                x += self.land_w
+            if i == 1 or i == 3:
+                x += self.land_w / 2
+            for land in line:
+                land_img = self.lands_imgs[land.resource].copy()
+                if land.num != 7:
+                    land_img.paste(self.land_nums[land.num], (83, 104), self.number_mask)
+                layer.paste(land_img, (int(x) - left, int(y) - top), self.land_mask)
+                x += self.land_w
+            y += (self.land_mid_h + self.land_hat_h)
+        return layer
+
+
+# draws the game frames from the board events
+class RenderSink(Sink):
+    def __init__(self, api: API):
+        self.api = api
+
+    # whether the events draw a frame or only update the canvas
+    @property
+    def saving(self):
+        return self.api.save_frames
+
+    @saving.setter
+    def saving(self, value):
+        self.api.save_frames = value
+
+    def turn_started(self, event: TurnStarted):
+        self.api.round, self.api.turn = event.round, event.turn
+        self.api.new_turn_name(event.name)
+
+    def dice_thrown(self, event: DiceThrown):
+        api = self.api
+        api.show_dice(event.die1, event.die2)
+        for player, resources in enumerate(event.resources):
+            api.print_resources(player, resources)
+        api.save_file()
+        api.delete_action()
+
+    def action_applied(self, event: ActionApplied):
+        api = self.api
+        log = event.log
+        api.print_action(event.name)
+        if event.note is not None:
+            api.write_a_note(event.note)
+        if 'location' in log and 'u' in log['location']:
+            u, v = log['location']['u'], log['location']['v']
+            i0, j0, i1, j1 = u['location x'], u['location y'], v['location x'], v['location y']
+            api.print_road(event.player, i0, j0, i1, j1)
+            api.point_on_road(i0, j0, i1, j1)
+        elif 'location' in log:
+            i, j = log['location']['location x'], log['location']['location y']
+            if event.name == 'build city':
+                api.print_city(event.player, i, j)
+            else:
+                api.print_settlement(event.player, i, j)
+            api.point_on_crossroad(i, j)
+        elif event.name == 'trade':
+            api.trade(api.num_of_players, event.player, s2r(log['source']), s2r(log['destination']), log['give'],
+                      log['take'])
+        api.print_resources(event.player, event.resources)
+        api.save_file()
+        api.delete_action()
+
+    def resources_changed(self, event: ResourcesChanged):
+        self.api.print_resources(event.player, event.resources)
+
+    def close(self):
+        self.api.frames.close()
@@ -9,7 +9,6 @@ from Resources import SETTLEMENT_PRICE
 from Resources import ROAD_PRICE
 from Resources import CITY_PRICE
 from Resources import DEV_PRICE
-from API import API
 from Auxilary import r2s
 from Resources import Resource
 from DevStack import KnightCard
@@ -17,13 +16,14 @@ from DevStack import Monopole
 from DevStack import YearOfProsper
 from DevStack import VictoryPointCard
 from DevStack import RoadBuilding
+from Events import ActionApplied
+from Events import ResourcesChanged
+import Keys
 from abc import ABC
 import math
 from random import randrange
 from random import uniform
 
-api: API
-
 
 class Action(ABC):
     def __init__(self, hand: Hand, heuristic_method):
@@ -34,12 +34,23 @@ class Action(ABC):
         self.index = hand.index
         self.points = self.hand.points  # how many points the player has before the action get executed
         self.heuristic_method = heuristic_method
-        # self.heuristic = hand.heuristic if self.heuristic_method is None else self.heuristic_method(self)
+        self.heuristic_value = None  # scored on first use, see heuristic below
         self.name = 'action'
-        self.heuristic = uniform(0, 1) if heuristic_method is None else heuristic_method(self)
         self.log = self.hand.board.log  # type: Log
         self.statistics_logger = self.hand.board.statistics_logger  # type: StatisticsLogger
 
+    # the score is only computed when it is asked for (or by Heuristics.score_actions), most candidates are dropped
+    # before that
+    @property
+    def heuristic(self):
+        if self.heuristic_value is None:
+            self.heuristic_value = uniform(0, 1) if self.heuristic_method is None else self.heuristic_method(self)
+        return self.heuristic_value
+
+    @heuristic.setter
+    def heuristic(self, value):
+        self.heuristic_value = value
+
     def evaluation_on(self):
         self.evaluation_state = True
 
@@ -48,15 +59,17 @@ class Action(ABC):
 
     # do action return necessary information for undo
     def do_action(self):
-        if not self.evaluation_state:
-            print(self.name)
         # self.hand.heuristic = self.heuristic
         return None
 
-    def log_action(self):
+    # the action as it is saved in the game log
+    def action_log(self):
         # ToDo: build statistic based on the name of the player (on Dork, Guru, or NNPlayer)
-        history_log = {'name': self.name, 'player': self.hand.index}
-        self.log.action(history_log)
+        return {'name': self.name, 'player': self.hand.index}
+
+    # an extra line for the renderer
+    def note(self):
+        return None
 
     def tmp_do(self):
         pass
@@ -64,22 +77,22 @@ class Action(ABC):
     def undo(self, info):
         pass
 
+    # tell the board sinks (game log, statistics, console, renderer) the action was played
     def shared_aftermath(self):
-        if not self.evaluation_state:
-            api.print_action(self.name)
-            api.print_resources(self.hand.index, self.hand.resources)
-            api.save_file()
-            api.delete_action()
-            self.log_action()
+        events = self.board.events
+        if not self.evaluation_state and events.active:
             essentials, regulars = self.create_keys()
-            self.statistics_logger.save_action(self.hand.index, essentials, regulars)
-            if self.hand.points > self.points:
-                self.statistics_logger.got_point(self.hand.index)
-            print(self.name)
-            print(self.heuristic)
+            events.publish(ActionApplied(self.name, self.hand.index, self.action_log(),
+                                         dict(self.hand.resources.items()), essentials, regulars,
+                                         self.hand.points > self.points, self.heuristic_value, self.note()))
+
+    def resources_changed(self, hand: Hand):
+        events = self.board.events
+        if not self.evaluation_state and events.active:
+            events.publish(ResourcesChanged(hand.index, dict(hand.resources.items())))
 
     def create_keys(self):
-        essentials = [self.name, 'points : ' + str(self.points), 'player : ' + str(self.hand.name)]
+        essentials = [Keys.ACTION(self.name), Keys.POINTS(self.points), Keys.PLAYER(self.hand.name)]
         return essentials, []
 
 
@@ -127,6 +140,8 @@ class UseKnight(UseDevCard):
         resource = self.use_knight()
         # ToDo : give a more meaningful type
         self.shared_aftermath()
+        if resource is not None:
+            self.resources_changed(self.hands[self.dst])
         return terrain, self.dst, self.hand.index, resource
 
     # terrain = where to put the bandit
@@ -137,14 +152,14 @@ class UseKnight(UseDevCard):
         for knight in hand.cards["knight"]:
             if knight.is_valid():
                 if terrain.put_bandit():
-                    hand.cards["knight"].remove(knight)
+                    hand.remove_card(knight)
                     return self.steal()
         return None
 
     # todo test it
     def undo(self, undo_info):
         terrain, destination, source, resource = undo_info  # type: (Terrain, int, int, Resource)
-        terrain.put_bandit()
+        self.board.bandit_location = terrain
         self.hands[destination].add_resources(resource, 1)
         self.hands[source].subtract_resources(resource, 1)
         card = KnightCard()
@@ -169,7 +184,7 @@ class UseKnight(UseDevCard):
         essentials, regulars = super(UseKnight, self).create_keys()
         n_i, p_i = self.hand.board.bandit_location.bandit_value(self.hand.index)
         n_f, p_f = self.terrain.bandit_value(self.hand.index)
-        regulars += ['unlock my production : ' + str(n_i - n_f), 'lock there production : ' + str(p_f - p_i)]
+        regulars += [Keys.UNLOCK_PRODUCTION(n_i - n_f), Keys.LOCK_PRODUCTION(p_f - p_i)]
         return essentials, regulars
 
 
@@ -186,6 +201,9 @@ class UseMonopole(UseDevCard):
         amounts = self.use_monopole()
         # ToDo : give a more meaningful type
         self.shared_aftermath()
+        for hand, amount in zip(self.hands, amounts):
+            if amount:
+                self.resources_changed(hand)
         return amounts, self.resource
 
     def undo(self, info):
@@ -205,9 +223,9 @@ class UseMonopole(UseDevCard):
 
     def use_monopole(self):
         amounts = []
-        for index, card in enumerate(self.hand.cards["monopole"]):
+        for card in self.hand.cards["monopole"]:
             if card.is_valid():
-                self.hand.cards["monopole"].pop(index)
+                self.hand.remove_card(card)
                 for hand in self.hand.board.hands:
                     if hand.index != self.hand.index:
                         amount = hand.resources[self.resource]
@@ -224,7 +242,7 @@ class UseMonopole(UseDevCard):
         for hand in self.hand.board.hands:
             if hand != self.hand:
                 take += hand.resources[self.resource]
-        regulars += ['cards i get : ' + str(take)]
+        regulars += [Keys.CARDS_I_GET(take)]
         return essentials, regulars
 
 
@@ -261,7 +279,7 @@ class UseYearOfPlenty(UseDevCard):
             if card.is_valid():
                 self.hand.resources[self.resource1] += 1
                 self.hand.resources[self.resource2] += 1
-                self.hand.cards["year of prosper"].remove(card)
+                self.hand.remove_card(card)
 
 
 class UseBuildRoads(UseDevCard):
@@ -281,8 +299,9 @@ class UseBuildRoads(UseDevCard):
 
     def undo(self, info):
         r1, r1i, r2, r2i = info  # type: Road, tuple, Road, tuple
-        r1.undo_build(r1i)
+        # the second road was built on top of the first one, undo it first
         r2.undo_build(r2i)
+        r1.undo_build(r1i)
         card = RoadBuilding()
         card.ok_to_use = True
         self.hand.add_card(card)
@@ -299,8 +318,8 @@ class UseBuildRoads(UseDevCard):
             heuristic_increment += (self.hand.board.longest_road_owner == self.hand.index) * 5
         heuristic_increment += self.hand.parameters.longest_road_value - old_road_length
         # hand_heuristic = self.hand.heuristic
-        build_road1.undo(None)
         build_road2.undo(None)
+        build_road1.undo(None)
         return heuristic_increment
 
     def build_2_roads(self):
@@ -308,9 +327,9 @@ class UseBuildRoads(UseDevCard):
         road1 = self.road1  # type: Road
         road2 = self.road2  # type: Road
         cards = hand.cards["road builder"]
-        for index, card in enumerate(cards):
+        for card in cards:
             if card.ok_to_use:
-                self.hand.cards["road builder"].pop(index)
+                self.hand.remove_card(card)
                 # self.heuristic += self.compute_heuristic()
                 info1 = road1.build(hand.index)
                 info2 = road2.build(hand.index)
@@ -360,7 +379,7 @@ class BuildSettlement(Action):
     def do_action(self):
         super().do_action()
         undo_info = self.buy_settlement()
-        self.action_aftermath()
+        self.shared_aftermath()
         return undo_info
 
     def undo(self, info):
@@ -369,20 +388,12 @@ class BuildSettlement(Action):
         self.hand.receive(SETTLEMENT_PRICE)
         self.hand.settlements_log.pop()
 
-    def action_aftermath(self):
-        i, j = self.crossroad.location
-        api.print_action(self.name)
-        api.print_settlement(self.hand.index, i, j)
-        api.point_on_crossroad(i, j)
-        self.shared_aftermath()
-
-    def log_action(self):
-        log = {
+    def action_log(self):
+        return {
             'name': self.name,
             'player': self.hand.index,
             'location': self.crossroad.location_log()
         }
-        self.log.action(log)
 
     def is_legal(self):
         return self.hand.can_pay(SETTLEMENT_PRICE)
@@ -404,24 +415,21 @@ class BuildSettlement(Action):
 
     def create_settlement(self):
         hand = self.hand
-        self.crossroad.connected[hand.index] = True
         hand.settlement_pieces -= 1
         hand.points += 1
         for resource in Resource:
             if resource is not Resource.DESSERT:
                 hand.production_all += self.crossroad.val[resource] / 36
         undo_info = self.crossroad.build(hand.index)
-        hand.set_distances()
         if self.crossroad.port is not None:
             hand.ports.add(self.crossroad.port)
         return undo_info
 
     def create_keys(self):
         essentials, regulars = super().create_keys()
-        regulars += ['all production : ' + str(self.crossroad.val['sum'])]
-        for resource in Resource:
-            if resource != Resource.DESSERT:
-                regulars += [r2s(resource) + ' : ' + str(self.crossroad.val[resource])]
+        regulars += [Keys.ALL_PRODUCTION(self.crossroad.val['sum'])]
+        for resource, feature in Keys.RESOURCE_PRODUCTION:
+            regulars += [feature(self.crossroad.val[resource])]
         return essentials, regulars
 
 
@@ -433,7 +441,7 @@ class BuildFirstSettlement(BuildSettlement):
     def do_action(self):
         build_info = self.create_settlement()
         self.hand.settlements_log += [self.crossroad]
-        self.action_aftermath()
+        self.shared_aftermath()
         return build_info
 
     def undo(self, info):
@@ -453,7 +461,7 @@ class BuildSecondSettlement(BuildFirstSettlement):
     def do_action(self):
         build_info = self.create_settlement()
         self.hand.settlements_log += [self.crossroad]
-        self.action_aftermath()
+        self.shared_aftermath()
         return build_info
 
 
@@ -466,7 +474,7 @@ class BuildCity(Action):
 
     def do_action(self):
         build_info = self.buy_city()
-        self.action_aftermath()
+        self.shared_aftermath()
         return build_info
 
     def undo(self, info):
@@ -475,20 +483,12 @@ class BuildCity(Action):
         self.hand.receive(CITY_PRICE)
         self.hand.cities.pop()
 
-    def action_aftermath(self):
-        i, j = self.crossroad.location
-        api.print_action(self.name)
-        api.print_city(self.hand.index, i, j)
-        api.point_on_crossroad(i, j)
-        self.shared_aftermath()
-
-    def log_action(self):
-        log = {
+    def action_log(self):
+        return {
             'name': self.name,
             'player': self.hand.index,
             'location': self.crossroad.location_log()
         }
-        self.log.action(log)
 
     def is_legal(self):
         return self.hand.can_pay(CITY_PRICE)
@@ -513,15 +513,13 @@ class BuildCity(Action):
         hand.city_pieces -= 1
         hand.points += 1
         build_info = self.crossroad.build(hand.index)
-        hand.set_distances()
         return build_info
 
     def create_keys(self):
         essentials, regulars = super().create_keys()
-        regulars += ['all production : ' + str(self.crossroad.val['sum'])]
-        for resource in Resource:
-            if resource != Resource.DESSERT:
-                regulars += [r2s(resource) + ' : ' + str(self.crossroad.val[resource])]
+        regulars += [Keys.ALL_PRODUCTION(self.crossroad.val['sum'])]
+        for resource, feature in Keys.RESOURCE_PRODUCTION:
+            regulars += [feature(self.crossroad.val[resource])]
         return essentials, regulars
 
 
@@ -534,25 +532,18 @@ class BuildRoad(Action):
     def do_action(self):
         super().do_action()
         info = self.buy_road()
-        self.action_aftermath()
-        return info
-
-    def action_aftermath(self):
-        api.print_action(self.name)
-        api.write_a_note(str(self.check_longest_road()))
-        i0, j0 = self.road.neighbors[0].location
-        i1, j1 = self.road.neighbors[1].location
-        api.print_road(self.hand.index, i0, j0, i1, j1)
-        api.point_on_road(i0, j0, i1, j1)
         self.shared_aftermath()
+        return info
 
-    def log_action(self):
-        log = {
+    def action_log(self):
+        return {
             'name': self.name,
             'player': self.hand.index,
             'location': self.road.location_log()
         }
-        self.log.action(log)
+
+    def note(self):
+        return str(self.check_longest_road())
 
     def is_legal(self):
         if self.hand.can_pay(ROAD_PRICE):
@@ -575,7 +566,6 @@ class BuildRoad(Action):
     def create_road(self):
         self.hand.road_pieces -= 1
         info = self.road.build(self.hand.index)
-        self.hand.set_distances()
         return info
 
     def compute_heuristic(self):
@@ -590,39 +580,8 @@ class BuildRoad(Action):
         build_road.undo(None)
         return heuristic_increment
 
-    def travel_left(self, cr: Crossroad, roads, right):
-        end = True
-        longest_road = roads
-        for n in cr.neighbors:
-            if n.road.owner == self.hand.index and n.road.traveled is not True:
-                end = False
-                n.road.traveled = True
-                current_road = self.travel_left(n.crossroad, roads + 1, right)
-                n.road.traveled = False
-                if longest_road < current_road:
-                    longest_road = current_road
-        if end:
-            return roads + self.travel_right(right, 0) + 1
-        else:
-            return longest_road
-
-    def travel_right(self, cr: Crossroad, roads):
-        longest_right_road = roads
-        for n in cr.neighbors:
-            if n.road.owner == self.hand.index and n.road.traveled is not True:
-                n.road.traveled = True
-                right_road = self.travel_right(n.crossroad, roads + 1)
-                n.road.traveled = False
-                if longest_right_road < right_road:
-                    longest_right_road = right_road
-        return longest_right_road
-
     def check_longest_road(self):
-        left, right = self.road.neighbors  # type: Crossroad
-        self.road.traveled = True
-        longest_road = self.travel_left(left, 0, right)
-        self.road.traveled = False
-        return longest_road
+        return self.board.longest_roads.component_length(self.hand.index, self.road.index)
 
 
 class BuildFreeRoad(BuildRoad):
@@ -632,7 +591,7 @@ class BuildFreeRoad(BuildRoad):
 
     def do_action(self):
         info = self.create_road()
-        self.action_aftermath()
+        self.shared_aftermath()
         return info
 
     def is_legal(self):
@@ -652,7 +611,6 @@ class Trade(Action):
     def do_action(self):
         super().do_action()
         self.trade()
-        api.trade(self.hand.board.players, self.hand.index, self.src, self.dst, self.give, self.take)
         self.shared_aftermath()
         return self.src, self.give, self.dst, self.take
 
@@ -666,8 +624,8 @@ class Trade(Action):
     def compute_heuristic(self):
         pass
 
-    def log_action(self):
-        log = {
+    def action_log(self):
+        return {
             'name': self.name,
             'player': self.hand.index,
             'source': r2s(self.src),
@@ -675,7 +633,6 @@ class Trade(Action):
             'take': self.take,
             'give': self.give
         }
-        self.log.action(log)
 
     def is_legal(self):
         return self.hand.can_pay({self.src: self.give})
@@ -686,7 +643,7 @@ class Trade(Action):
 
     def create_keys(self):
         essentials, regulars = super().create_keys()
-        regulars += ['exchange rate : ' + str(self.exchange_rate)]
+        regulars += [Keys.EXCHANGE_RATE(self.exchange_rate)]
         return essentials, regulars
 
 
@@ -705,7 +662,9 @@ class BuyDevCard(Action):
         name = info
         hand = self.hand
         hand.receive(DEV_PRICE)
-        hand.cards[name].pop()
+        card = hand.cards[name][-1]
+        hand.remove_card(card)
+        self.board.devStack.put(card)
 
     def compute_heuristic(self):
         return self.hand.parameters.dev_card_value
@@ -715,7 +674,7 @@ class BuyDevCard(Action):
         stack = self.hand.board.devStack
         hand.pay(DEV_PRICE)
         card = stack.get()
-        hand.cards[card.name] += [card]
+        hand.add_card(card)
         return card.name
 
 
@@ -732,4 +691,4 @@ class ThrowCards(Action):
 
     def undo(self, info):
         for resource in self.cards:
-            self.hand.add_resources(resource, 1)
+            self.hand.add_resources(resource, self.cards[resource])
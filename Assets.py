@@ -0,0 +1,108 @@
+from PIL import Image
+from PIL import ImageFont
+from collections import OrderedDict
+import os
+import threading
+
+# ---- global variables ---- #
+
+CACHE_DIR = 'images/cache'
+FONT = 'Library/Fonts/Arial Bold.ttf'
+TILES_MAX = 256
+
+
+# ---- classes ---- #
+
+
+# every image the renderer uses, decoded at most once per process and shared read only by every API (paste them, or
+# copy them before drawing on them). resized variants are also kept on disk, keyed by the source file mtime and size,
+# so a new process reads the small image instead of decoding and resizing the full one again
+class AssetRegistry:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.images = {}  # type: dict[tuple, Image.Image]
+        self.fonts = {}  # type: dict[tuple[str, int], ImageFont.FreeTypeFont]
+        self.lock = threading.Lock()
+
+    def font(self, path, size) -> ImageFont.FreeTypeFont:
+        key = (path, size)
+        with self.lock:
+            if key not in self.fonts:
+                self.fonts[key] = ImageFont.truetype(path, size)
+            return self.fonts[key]
+
+    def get(self, path, size=None, mode=None) -> Image.Image:
+        key = (path, size, mode)
+        with self.lock:
+            if key not in self.images:
+                self.images[key] = self.load(path, size, mode)
+            return self.images[key]
+
+    def load(self, path, size, mode):
+        if size is None:
+            return self.decode(path, size, mode)
+        stat = os.stat(path)
+        prefix = self.cache_prefix(path, size, mode)
+        cached = prefix + '%x-%x.png' % (stat.st_mtime_ns, stat.st_size)
+        if os.path.exists(cached):
+            try:
+                img = Image.open(cached)
+                img.load()
+                return img
+            except (OSError, SyntaxError):
+                pass  # a broken cache file is rendered again and replaced
+        img = self.decode(path, size, mode)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # older variants of a source file that changed since. the current variant and the temporary files of other
+        # processes are left alone
+        for name in os.listdir(self.cache_dir):
+            variant = os.path.join(self.cache_dir, name)
+            if variant.startswith(prefix) and variant.endswith('.png') and variant != cached:
+                try:
+                    os.remove(variant)
+                except FileNotFoundError:
+                    pass
+        # other processes only ever see a complete file under the cache name
+        temporary = cached + '.%d.tmp' % os.getpid()
+        img.save(temporary, 'PNG')
+        os.replace(temporary, cached)
+        return img
+
+    @staticmethod
+    def decode(path, size, mode):
+        img = Image.open(path)
+        img.load()
+        if size is not None:
+            img = img.resize(size)
+        if mode is not None:
+            img = img.convert(mode)
+        return img
+
+    def cache_prefix(self, path, size, mode):
+        name = os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+        return os.path.join(self.cache_dir, '%s-%dx%d-%s-' % (name, size[0], size[1], mode or 'raw'))
+
+
+# rendered text tiles (resource numbers, action banners) by their text, font and size. the tiles are shared read only
+# like the assets, and the least recently used ones are evicted past maxsize
+class TileCache:
+    def __init__(self, maxsize=TILES_MAX):
+        self.maxsize = maxsize
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, render):
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+        tile = render()
+        with self.lock:
+            self.tiles[key] = tile
+            while len(self.tiles) > self.maxsize:
+                self.tiles.popitem(last=False)
+        return tile
+
+
+assets = AssetRegistry()
+tiles = TileCache()
@@ -31,12 +31,12 @@ def s2r(resource):
         return Resource.DESSERT
 
 
-def resource_log(hand):
-    return {'wood': hand.resources[Resource.WOOD],
-            'clay': hand.resources[Resource.CLAY],
-            'sheep': hand.resources[Resource.SHEEP],
-            'wheat': hand.resources[Resource.WHEAT],
-            'iron': hand.resources[Resource.IRON]}
+def resource_log(resources):
+    return {'wood': resources[Resource.WOOD],
+            'clay': resources[Resource.CLAY],
+            'sheep': resources[Resource.SHEEP],
+            'wheat': resources[Resource.WHEAT],
+            'iron': resources[Resource.IRON]}
 
 
 def next_turn(players, rnd, turn) -> (int, int):
@@ -63,4 +63,26 @@ def init_cr_line_len():
     return line_len
 
 
+# how many roads are in a line
+def init_road_line_len():
+    line_len = []
+    length = 3
+    step = 1
+    mid = 0
+    for i in range(11):
+        if i % 2:
+            line_len += [length + 1]
+            length += step * (1 - mid)
+        else:
+            line_len += [2 * length]
+            length += step * mid
+        if i == 4:
+            step = 0
+        if i == 5:
+            step = -1
+            mid = 1
+    return line_len
+
+
 cr_line_len = init_cr_line_len()
+road_line_len = init_road_line_len()
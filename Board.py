@@ -1,17 +1,29 @@
 from Hand import Hand
 from Resources import Resource
+from BoardState import BoardState
+from BoardState import ConnectedView
+from BoardState import NO_OWNER
+from BoardState import SLOT
+from MoveIndex import MoveIndex
+from Distances import DistanceEngine
+from LongestRoad import LongestRoadEngine
 from DevStack import DevStack
 import random
 import Dice
 from Log import StatisticsLogger
+from Events import EventBus
+from Events import JsonLogSink
+from Events import StatisticsSink
 from Auxilary import r2s
 from Auxilary import s2r
 from Auxilary import cr_line_len
+from Auxilary import road_line_len
+from Topology import topology
 
 # ---- global variables ---- #
 
 DESSERT = 7
-INFINITY = 100
+EMPTY_VAL = {"sum": 0, Resource.WOOD: 0, Resource.CLAY: 0, Resource.WHEAT: 0, Resource.SHEEP: 0, Resource.IRON: 0}
 
 
 # ---- classes ---- #
@@ -22,21 +34,31 @@ class Terrain:
         self.resource = None
         self.num = num
         self.crossroads = []
-        self.has_bandit = False
         self.board = None
         self.location = None
+        self.index = None
 
     def __str__(self):
         return "(" + str(self.num) + "," + str(self.resource) + ")"
 
+    @property
+    def has_bandit(self):
+        return self.board.state.bandit == self.index
+
+    @has_bandit.setter
+    def has_bandit(self, value):
+        state = self.board.state
+        if value:
+            state.set_bandit(self.index)
+        elif state.bandit == self.index:
+            state.set_bandit(NO_OWNER)
+
     def set_resource(self, resource):
         self.resource = resource
 
     def produce(self):
         if not self.has_bandit and self.resource is not Resource.DESSERT:
-            for cr in self.crossroads:
-                if cr.ownership is not None:
-                    self.board.hands[cr.ownership].resources[self.resource] += cr.building
+            self.board.state.produce(self.index, SLOT[self.resource])
 
     def can_put_bandit(self):
         return not self.has_bandit
@@ -45,11 +67,7 @@ class Terrain:
         if self.can_put_bandit():
             self.board.bandit_location.has_bandit = False
             self.has_bandit = True
-            steal_stack = []
-            for cr in self.crossroads:
-                if cr.ownership is not None:
-                    steal_stack += [cr.ownership]
-            return steal_stack
+            return self.board.state.terrain_owners(self.index)
 
     def get_log(self):
         log = {
@@ -70,46 +88,73 @@ class Terrain:
 
 
 class Crossroad:
-    def __init__(self, board):
+    def __init__(self, board, index):
         # logistic
+        self.index = index
         self.location = None
         self.api_location = None
         self.board = board
+        self.state = board.state  # type: BoardState
         self.terrains = []  # type: list[Terrain]
         self.neighbors = []  # type: list[Neighbor]
         # rules
-        self.connected = [False] * self.board.players
-        self.legal = True
+        self.connected = ConnectedView(self.state, index)
         # heuristic
-        self.val = {"sum": 0, Resource.WOOD: 0, Resource.CLAY: 0, Resource.WHEAT: 0, Resource.SHEEP: 0,
-                    Resource.IRON: 0}
-        self.longest_road = [0] * self.board.players
-        self.distance = [INFINITY, INFINITY, INFINITY, INFINITY]
-        self.fertility_dist = 0
+        self.val = EMPTY_VAL.copy()
         # game
-        self.ownership = None
-        self.building = 0
         self.port = None
 
+    # ---- game state, stored in the board state arrays ---- #
+
+    @property
+    def ownership(self):
+        owner = self.state.cr_owner[self.index]
+        return None if owner == NO_OWNER else owner
+
+    @ownership.setter
+    def ownership(self, player):
+        self.state.set_owner(self.index, NO_OWNER if player is None else player)
+
+    @property
+    def building(self):
+        return self.state.cr_building[self.index]
+
+    @building.setter
+    def building(self, level):
+        self.state.set_building(self.index, level)
+
+    # no neighbor is built on (distance rule)
+    @property
+    def legal(self):
+        return self.state.is_legal(self.index)
+
+    # ---- heuristic distances, kept by the board distance engine ---- #
+
+    @property
+    def distance(self):
+        return [dist[self.index] for dist in self.board.distances.player_dist]
+
+    @property
+    def fertility_dist(self):
+        return self.board.distances.fertility[self.index]
+
     def build(self, player):
-        legals = []
+        connected = self.connected[player]
         if self.ownership is None:
             self.ownership = player
-            for n in self.neighbors:
-                legals += [n.crossroad.legal]
-                n.crossroad.legal = False
+            self.connected[player] = True
         if self.ownership == player and self.building < 2:
             self.building += 1
-            self.fertility_dist = INFINITY
-        return legals
+        self.board.crossroad_changed(self.index)
+        return connected
 
-    def unbuild(self, player, legals):
+    def unbuild(self, player, connected):
         assert self.ownership == player
         if self.building == 1:
             self.ownership = None
-            for n in range(len(self.neighbors)):
-                self.neighbors[n].crossroad.legal = legals[n]
+            self.connected[player] = connected
         self.building -= 1
+        self.board.crossroad_changed(self.index)
 
     def produce(self, player):
         for t in self.terrains:
@@ -184,39 +229,25 @@ class Crossroad:
 
 
 class Road:
-    def __init__(self, board, owner=None):
-        self.owner = owner
+    def __init__(self, board, index):
+        self.index = index
+        self.state = board.state  # type: BoardState
         self.api_location = [0, 0, 0, 0]
         self.neighbors = []
         self.board = board
         self.temp_build_info = {}
-        self.traveled = False
-
-    def upgrade_longest_road(self, player):
-        i = player
-        v = self.neighbors[0].longest_road
-        u = self.neighbors[1].longest_road
-        temp = v[i]
-        if v[i] == 0:
-            temp = u[i] + 1
-        if u[i] == 0:
-            u[i] = v[i] + 1
-        v[i] = temp
-        if v[i] > self.board.hands[i].longest_road:
-            self.board.hands[i].longest_road = v[i]
-        if u[i] > self.board.hands[i].longest_road:
-            self.board.hands[i].longest_road = u[i]
-        if self.board.hands[i].longest_road > self.board.longest_road_size:
-            self.board.longest_road_size = self.board.hands[i].longest_road
-            if self.board.longest_road_owner is not None:
-                self.board.hands[self.board.longest_road_owner].points -= 2
-            self.board.longest_road_owner = player
-            self.board.hands[player].points += 2
+
+    @property
+    def owner(self):
+        owner = self.state.road_owner[self.index]
+        return None if owner == NO_OWNER else owner
+
+    @owner.setter
+    def owner(self, player):
+        self.state.set_road_owner(self.index, NO_OWNER if player is None else player)
 
     def is_connected(self, player):
-        if self.neighbors[0].connected[player] or self.neighbors[1].connected[player]:
-            return True
-        return False
+        return self.state.is_connected(self.index, player)
 
     def is_legal(self, player):
         if self.owner is None and (self.is_connected(player)):
@@ -230,8 +261,9 @@ class Road:
         n1, n2 = self.neighbors  # type: Crossroad, Crossroad
         n1.connected[player] = c1
         n2.connected[player] = c2
-        self.board.longest_road_size = lrs
-        self.board.longest_road_owner = lro
+        del self.board.hands[player].lands_log[-2:]
+        self.board.road_changed(self.index, player)
+        self.board.set_longest_road(lro, lrs)
 
     def build(self, player):
         self.owner = player
@@ -239,9 +271,10 @@ class Road:
         hand = self.board.hands[player]
         hand.lands_log += [n1, n2]
         c1, c2 = n1.connected[player], n2.connected[player]
-        n1.connected[player], n2.connected[player] = True, True
-        self.upgrade_longest_road(player)
         lrs, lro = self.board.longest_road_size, self.board.longest_road_owner
+        n1.connected[player], n2.connected[player] = True, True
+        self.board.road_changed(self.index, player)
+        self.board.update_longest_road(player)
         return c1, c2, lrs, lro
 
     def get_location(self):
@@ -274,9 +307,15 @@ class Board:
     def __init__(self, players, log):
         self.statistics_logger = StatisticsLogger()
         self.log = log
+        # the game log and the statistics always listen, console and renderer sinks are added by the game
+        self.events = EventBus([JsonLogSink(log), StatisticsSink(self.statistics_logger)])
         self.players = players
         self.devStack = DevStack()
         self.dice = Dice.Dice()
+        self.state = BoardState(players, topology)
+        self.moves = MoveIndex(self.state)
+        self.distances = DistanceEngine(self.state)
+        self.longest_roads = LongestRoadEngine(self.state)
 
         self.map = [[Terrain(10), Terrain(2), Terrain(9)],
                     [Terrain(12), Terrain(6), Terrain(4), Terrain(10)],
@@ -284,78 +323,48 @@ class Board:
                     [Terrain(8), Terrain(3), Terrain(4), Terrain(5)],
                     [Terrain(5), Terrain(6), Terrain(11)]]
 
-        self.bandit_location = None
+        self.terrain_list = []  # type: list[Terrain]
+        for line in self.map:
+            for terrain in line:
+                terrain.index = len(self.terrain_list)
+                self.terrain_list.append(terrain)
 
         # create 2d array of crossroads
         self.crossroads = []  # type: list[list[Crossroad]]
-        for i in range(12):
+        self.crossroad_list = []  # type: list[Crossroad]
+        for i in range(len(cr_line_len)):
             line = []
             for j in range(cr_line_len[i]):
-                cr = Crossroad(self)
+                cr = Crossroad(self, len(self.crossroad_list))
                 cr.location = (i, j)
+                cr.port = topology.ports[cr.index]
                 line.append(cr)
+                self.crossroad_list.append(cr)
             self.crossroads.append(line)
 
-        # build ports
-        self.crossroads[0][0].port = Resource.WOOD
-        self.crossroads[1][0].port = Resource.WOOD
-        self.crossroads[0][1].port = Resource.DESSERT
-        self.crossroads[1][2].port = Resource.DESSERT
-        self.crossroads[2][3].port = Resource.DESSERT
-        self.crossroads[3][4].port = Resource.DESSERT
-        self.crossroads[3][0].port = Resource.SHEEP
-        self.crossroads[4][0].port = Resource.SHEEP
-        self.crossroads[5][5].port = Resource.DESSERT
-        self.crossroads[6][5].port = Resource.DESSERT
-        self.crossroads[7][0].port = Resource.WHEAT
-        self.crossroads[8][0].port = Resource.WHEAT
-        self.crossroads[8][4].port = Resource.IRON
-        self.crossroads[9][3].port = Resource.IRON
-        self.crossroads[10][0].port = Resource.CLAY
-        self.crossroads[11][0].port = Resource.CLAY
-        self.crossroads[10][2].port = Resource.DESSERT
-        self.crossroads[11][1].port = Resource.DESSERT
-
-        # link the terrains to their crossroads and vice versa and give them link to board
-        for i, line in enumerate(self.map):
-            for j, terrain in enumerate(line):
-                terrain.location = (i, j)
-                terrain.board = self
-                top = 0 if i < 3 else 1
-                terrain.crossroads += [self.crossroads[2 * i][j + top]]
-                terrain.crossroads += [self.crossroads[2 * i + 1][j]]
-                terrain.crossroads += [self.crossroads[2 * i + 1][j + 1]]
-                terrain.crossroads += [self.crossroads[2 * i + 2][j]]
-                terrain.crossroads += [self.crossroads[2 * i + 2][j + 1]]
-                bottom = 1 if i < 2 else 0
-                terrain.crossroads += [self.crossroads[2 * i + 3][j + bottom]]
-                for cr in terrain.crossroads:
-                    cr.terrains += [terrain]
-
         # create the roads
-        self.roads = []
-        length = 3
-        step = 1
-        mid = 0
-        for i in range(11):
+        self.roads = []  # type: list[list[Road]]
+        self.road_list = []  # type: list[Road]
+        for i in range(len(road_line_len)):
             line = []
-            if i % 2:
-                for j in range(length + 1):
-                    line.append(Road(self))
-                length += step * (1 - mid)
-            else:
-                for j in range(2 * length):
-                    line.append(Road(self))
-                length += step * mid
-            if i == 4:
-                step = 0
-            if i == 5:
-                step = -1
-                mid = 1
+            for j in range(road_line_len[i]):
+                road = Road(self, len(self.road_list))
+                line.append(road)
+                self.road_list.append(road)
             self.roads.append(line)
 
-        # link cross roads to roads
-        self.add_neighbors_to_roads()
+        # link the board objects according to the shared topology tables
+        for terrain in self.terrain_list:
+            terrain.board = self
+            terrain.location = topology.terrain_locations[terrain.index]
+            terrain.crossroads = [self.crossroad_list[cr] for cr in topology.terrain_crossroads[terrain.index]]
+        for cr in self.crossroad_list:
+            cr.terrains = [self.terrain_list[t] for t in topology.cr_terrains[cr.index]]
+            cr.neighbors = [Neighbor(self.crossroad_list[neighbor], self.road_list[road])
+                            for neighbor, road in zip(topology.cr_neighbors[cr.index], topology.cr_roads[cr.index])]
+        for road in self.road_list:
+            u, v = topology.road_ends[road.index]
+            road.neighbors = [self.crossroad_list[u], self.crossroad_list[v]]
 
         # create hands
         self.hands: list[Hand] = []
@@ -372,6 +381,16 @@ class Board:
         self.largest_army_size = 2
         self.largest_army_owner = None
 
+    @property
+    def bandit_location(self):
+        if self.state.bandit == NO_OWNER:
+            return None
+        return self.terrain_list[self.state.bandit]
+
+    @bandit_location.setter
+    def bandit_location(self, terrain):
+        self.state.set_bandit(NO_OWNER if terrain is None else terrain.index)
+
     def shuffle_map(self):
         # shuffle the terrain on the board and link the crossroads to them
         resource_stack = [Resource.DESSERT] + [Resource.IRON] * 3 + [Resource.CLAY] * 3 + [Resource.WOOD] * 4 + [
@@ -409,31 +428,14 @@ class Board:
             for cr in line:
                 cr.set_heuristic_value()
 
-    # very convoluted function to link each road with its vertices crossroads and vice versa
-    def add_neighbors_to_roads(self):
-        i = 0
-        xor = False
-        for line in self.roads:
-            up = 0
-            down = 0
-            if i == 5:
-                xor = True
-            for road in line:
-                cr1 = self.crossroads[i][up]
-                road.neighbors += [cr1]
-                cr2 = self.crossroads[i + 1][down]
-                road.neighbors += [cr2]
-                cr1.add_neighbor(road, cr2)
-                cr2.add_neighbor(road, cr1)
-                if i % 2:
-                    up += 1
-                    down += 1
-                else:
-                    if (up == down) != xor:
-                        down += 1
-                    else:
-                        up += 1
-            i += 1
+    # ---- keep the incremental structures up to date ---- #
+
+    def crossroad_changed(self, cr):
+        self.distances.crossroad_changed(cr)
+        self.longest_roads.crossroad_changed(cr)
+
+    def road_changed(self, road, player):
+        self.longest_roads.road_changed(road, player)
 
     def log_board(self):
         log = []
@@ -445,61 +447,71 @@ class Board:
                 log += [t_log]
         self.log.board(log)
 
+    # ---- snapshot ---- #
+
+    # the whole mutable state of the game (board, hands, development stack, longest road and largest army holders)
+    # as plain data, so it can be restored any number of times or sent to another process
+    def snapshot(self):
+        return (self.state.snapshot(), self.distances.snapshot(), self.longest_roads.snapshot(),
+                [hand.snapshot() for hand in self.hands], self.devStack.snapshot(),
+                (self.longest_road_size, self.longest_road_owner, self.largest_army_size, self.largest_army_owner),
+                (self.dice.dice1.number, self.dice.dice2.number, self.dice.sum))
+
+    def restore(self, snapshot):
+        state, distances, longest_roads, hands, dev_stack, achievements, dice = snapshot
+        self.state.restore(state)
+        self.distances.restore(distances)
+        self.longest_roads.restore(longest_roads)
+        for hand, hand_snapshot in zip(self.hands, hands):
+            hand.restore(hand_snapshot)
+        self.devStack.restore(dev_stack)
+        self.longest_road_size, self.longest_road_owner, self.largest_army_size, self.largest_army_owner = achievements
+        self.dice.dice1.number, self.dice.dice2.number, self.dice.sum = dice
+
+    # ---- longest road ---- #
+
+    def set_longest_road(self, owner, size):
+        if owner != self.longest_road_owner:
+            if self.longest_road_owner is not None:
+                self.hands[self.longest_road_owner].points -= 2
+            if owner is not None:
+                self.hands[owner].points += 2
+        self.longest_road_owner = owner
+        self.longest_road_size = size
+
     def update_longest_road(self, player):
-        former = self.longest_road_owner
-        if former is not None:
-            self.hands[former].points -= 2
-        self.hands[player].points += 2
-        self.longest_road_size += 1
+        length = self.hands[player].longest_road
+        if length > self.longest_road_size:
+            self.set_longest_road(player, length)
 
     # ---- game development ---- #
 
     def next_turn(self, turn, rnd, dice=None):
         # Todo: delete comment
         # API.next_turn(self, turn, rnd, self.hands, dice)
-        pass
+        self.state.set_to_move(turn)
 
     # ---- get legal moves ---- #
 
     def get_settlements(self, player):
-        legal = []
-        for line in self.crossroads:
-            for cr in line:
-                if cr.ownership is player and cr.building == 1:
-                    legal += [cr]
-        return legal
+        return [self.crossroad_list[cr] for cr in self.moves.upgradable_settlements(player)]
 
     def get_legal_crossroads_start(self):
-        legal = []
-        for line in self.crossroads:
-            for cr in line:
-                if cr.legal and cr.ownership is None:
-                    legal += [cr]
-        return legal
+        return [self.crossroad_list[cr] for cr in self.moves.free_crossroads()]
 
     def get_lands(self, player):
         return self.hands[player].get_lands()
 
+    def get_nearest_land(self, player):
+        cr, distance = self.distances.nearest_land(player)
+        return None if cr is None else self.crossroad_list[cr], distance
+
     def get_legal_roads(self, player):
-        legal = []
-        for line in self.roads:
-            for road in line:
-                if road.is_legal(player):
-                    legal += [road]
-        return legal
+        return [self.road_list[road] for road in self.moves.legal_roads(player)]
 
     def get_two_legal_roads(self, player):
-        legal = []
-        for line1 in self.roads:
-            for road1 in line1:
-                if road1.is_legal(player):
-                    info1 = road1.build(player)
-                    for line2 in self.roads:
-                        for road2 in line2:
-                            if road2.is_legal(player):
-                                legal += [(road1, road2)]
-                    road1.undo_build(info1)
-        return legal
+        for road1, road2 in self.moves.road_pairs(player):
+            yield self.road_list[road1], self.road_list[road2]
 
     def get_names(self):
         names = []
@@ -510,6 +522,10 @@ class Board:
     def get_dice(self):
         return self.dice.dice1.number, self.dice.dice2.number
 
+    # zobrist hash of the current position
+    def get_key(self):
+        return self.state.key
+
 
 # ---- test functions ---- #
 
@@ -0,0 +1,288 @@
+from array import array
+from Resources import Resource
+from Topology import Topology
+from Topology import bits
+from DevStack import CARDS
+from Zobrist import zobrist_keys
+
+# ---- global variables ---- #
+
+NO_OWNER = -1
+
+# order of the resources inside a player's slice of the resources array (same order Hand always used)
+RESOURCES = (Resource.WOOD, Resource.IRON, Resource.WHEAT, Resource.SHEEP, Resource.CLAY)
+SLOT = {r: i for i, r in enumerate(RESOURCES)}
+RESOURCES_NUM = len(RESOURCES)
+CARDS_NUM = len(CARDS)
+
+
+# ---- classes ---- #
+
+
+# struct of arrays holding the mutable state of a board. crossroads, roads and terrains are addressed by their
+# flat index (row major order of board.crossroads, board.roads and board.map) and players by their hand index.
+# the objects of the board (Crossroad, Road, Terrain, Hand) read and write their game state through here,
+# so hot loops can run directly on the arrays.
+# every write goes through the setters below, which keep the zobrist key of the position and the bitboards up to date.
+# the bitboards are python ints with a bit per crossroad or road, so the rules become a few and/or operations
+class BoardState:
+    def __init__(self, players, topology: Topology):
+        crossroads_num = topology.crossroads_num
+        roads_num = topology.roads_num
+        self.players = players
+        self.crossroads_num = crossroads_num
+        self.roads_num = roads_num
+        # crossroads
+        self.cr_owner = array('b', [NO_OWNER] * crossroads_num)
+        self.cr_building = array('b', [0] * crossroads_num)
+        # roads
+        self.road_owner = array('b', [NO_OWNER] * roads_num)
+        # terrains
+        self.bandit = NO_OWNER
+        # hands
+        self.resources = array('i', [0] * (players * RESOURCES_NUM))  # [player * RESOURCES_NUM + slot]
+        self.cards = array('b', [0] * (players * CARDS_NUM))  # [player * CARDS_NUM + kind]
+        # game
+        self.to_move = 0
+
+        # bitboards
+        self.player_crossroads = [0] * players  # the crossroads each player built on
+        self.player_roads = [0] * players
+        self.connected = [0] * players  # the crossroads each player's roads and buildings reach
+        self.reach = [0] * players  # the roads touching the connected crossroads of each player
+        self.occupied = 0
+        self.cities = 0
+        self.blocked = 0  # the neighbors of occupied crossroads (distance rule)
+        self.roads = 0
+
+        # zobrist hash of the position
+        self.keys = zobrist_keys(players, topology, RESOURCES_NUM, CARDS_NUM)
+        self.key = self.keys.to_move[self.to_move]
+
+        # the byte arrays in the order they are packed by snapshot
+        self.byte_arrays = (self.cr_owner, self.cr_building, self.road_owner, self.cards)
+
+        # static adjacency tables, shared with every other board
+        self.topology = topology
+        self.cr_terrains = topology.cr_terrains
+        self.cr_neighbors = topology.cr_neighbors
+        self.cr_roads = topology.cr_roads
+        self.road_ends = topology.road_ends
+        self.terrain_crossroads = topology.terrain_crossroads
+        self.cr_neighbor_masks = topology.cr_neighbor_masks
+        self.cr_road_masks = topology.cr_road_masks
+        self.road_end_masks = topology.road_end_masks
+
+    # ---- setters ---- #
+
+    def crossroad_key(self, cr, player, level):
+        if player == NO_OWNER or level == 0:
+            return 0
+        return self.keys.crossroads[cr][player * 2 + level - 1]
+
+    def set_owner(self, cr, player):
+        old = self.cr_owner[cr]
+        level = self.cr_building[cr]
+        self.key ^= self.crossroad_key(cr, old, level) ^ self.crossroad_key(cr, player, level)
+        self.cr_owner[cr] = player
+        bit = 1 << cr
+        if old != NO_OWNER:
+            self.player_crossroads[old] &= ~bit
+        if player != NO_OWNER:
+            self.player_crossroads[player] |= bit
+            self.occupied |= bit
+            self.blocked |= self.cr_neighbor_masks[cr]
+        elif old != NO_OWNER:
+            self.occupied &= ~bit
+            self.blocked = 0
+            for other in bits(self.occupied):
+                self.blocked |= self.cr_neighbor_masks[other]
+
+    def set_building(self, cr, level):
+        player = self.cr_owner[cr]
+        self.key ^= self.crossroad_key(cr, player, self.cr_building[cr]) ^ self.crossroad_key(cr, player, level)
+        self.cr_building[cr] = level
+        if level == 2:
+            self.cities |= 1 << cr
+        else:
+            self.cities &= ~(1 << cr)
+
+    def set_road_owner(self, road, player):
+        old = self.road_owner[road]
+        bit = 1 << road
+        if old != NO_OWNER:
+            self.key ^= self.keys.roads[road][old]
+            self.player_roads[old] &= ~bit
+            self.roads &= ~bit
+        if player != NO_OWNER:
+            self.key ^= self.keys.roads[road][player]
+            self.player_roads[player] |= bit
+            self.roads |= bit
+        self.road_owner[road] = player
+
+    def set_connected(self, cr, player, value):
+        bit = 1 << cr
+        if value:
+            self.connected[player] |= bit
+            self.reach[player] |= self.cr_road_masks[cr]
+        elif self.connected[player] & bit:
+            self.connected[player] &= ~bit
+            reach = 0
+            for other in bits(self.connected[player]):
+                reach |= self.cr_road_masks[other]
+            self.reach[player] = reach
+
+    def set_bandit(self, terrain):
+        if self.bandit != NO_OWNER:
+            self.key ^= self.keys.bandit[self.bandit]
+        if terrain != NO_OWNER:
+            self.key ^= self.keys.bandit[terrain]
+        self.bandit = terrain
+
+    def set_resource(self, index, amount):
+        keys, count = self.keys.resources[index], self.keys.count
+        self.key ^= count(keys, self.resources[index]) ^ count(keys, amount)
+        self.resources[index] = amount
+
+    def set_cards(self, player, kind, amount):
+        index = player * CARDS_NUM + kind
+        keys, count = self.keys.cards[index], self.keys.count
+        self.key ^= count(keys, self.cards[index]) ^ count(keys, amount)
+        self.cards[index] = amount
+
+    def set_to_move(self, player):
+        self.key ^= self.keys.to_move[self.to_move] ^ self.keys.to_move[player]
+        self.to_move = player
+
+    # ---- snapshot ---- #
+
+    def snapshot(self):
+        return (b''.join([a.tobytes() for a in self.byte_arrays]), self.resources.tobytes(), self.bandit,
+                self.to_move, self.key, self.player_crossroads.copy(), self.player_roads.copy(), self.connected.copy(),
+                self.reach.copy(), self.occupied, self.cities, self.blocked, self.roads)
+
+    def restore(self, snapshot):
+        (buffer, resources, self.bandit, self.to_move, self.key, player_crossroads, player_roads, connected, reach,
+         self.occupied, self.cities, self.blocked, self.roads) = snapshot
+        restore_arrays(self.byte_arrays, buffer)
+        restore_arrays((self.resources,), resources)
+        self.player_crossroads[:] = player_crossroads
+        self.player_roads[:] = player_roads
+        self.connected[:] = connected
+        self.reach[:] = reach
+
+    # ---- hot loops ---- #
+
+    def produce(self, terrain, slot):
+        owner, building, resources = self.cr_owner, self.cr_building, self.resources
+        for cr in self.terrain_crossroads[terrain]:
+            player = owner[cr]
+            if player != NO_OWNER:
+                index = player * RESOURCES_NUM + slot
+                self.set_resource(index, resources[index] + building[cr])
+
+    def terrain_owners(self, terrain):
+        owners = []
+        for cr in self.terrain_crossroads[terrain]:
+            if self.cr_owner[cr] != NO_OWNER:
+                owners += [self.cr_owner[cr]]
+        return owners
+
+    # ---- rules ---- #
+
+    def is_connected(self, road, player):
+        return bool(self.road_end_masks[road] & self.connected[player])
+
+    def is_legal(self, cr):
+        return not self.blocked >> cr & 1
+
+    def is_free(self, cr):
+        return not (self.blocked | self.occupied) >> cr & 1
+
+    def legal_roads(self, player):
+        return self.reach[player] & ~self.roads
+
+    def lands(self, player):
+        return self.connected[player] & ~(self.occupied | self.blocked)
+
+    def settlements(self, player):
+        return self.player_crossroads[player] & ~self.cities
+
+    def free_crossroads(self):
+        return self.topology.all_crossroads & ~(self.occupied | self.blocked)
+
+    def resources_number(self, player):
+        start = player * RESOURCES_NUM
+        return sum(self.resources[start:start + RESOURCES_NUM])
+
+
+# refill arrays in place (other objects keep references to them) from the bytes of their concatenation
+def restore_arrays(arrays, buffer):
+    view = memoryview(buffer)
+    start = 0
+    for a in arrays:
+        end = start + len(a) * a.itemsize
+        del a[:]
+        a.frombytes(view[start:end])
+        start = end
+
+
+# list like view of the connected flags of one crossroad, indexed by player
+class ConnectedView:
+    __slots__ = ('state', 'crossroad')
+
+    def __init__(self, state: BoardState, crossroad):
+        self.state = state
+        self.crossroad = crossroad
+
+    def __getitem__(self, player):
+        return bool(self.state.connected[player] >> self.crossroad & 1)
+
+    def __setitem__(self, player, value):
+        self.state.set_connected(self.crossroad, player, value)
+
+    def __len__(self):
+        return self.state.players
+
+    def __iter__(self):
+        for player in range(self.state.players):
+            yield self[player]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# dict like view of the resources of one player, keyed by Resource
+class ResourcesView:
+    __slots__ = ('state', 'base')
+
+    def __init__(self, state: BoardState, player):
+        self.state = state
+        self.base = player * RESOURCES_NUM
+
+    def __getitem__(self, resource):
+        return self.state.resources[self.base + SLOT[resource]]
+
+    def __setitem__(self, resource, amount):
+        self.state.set_resource(self.base + SLOT[resource], amount)
+
+    def __contains__(self, resource):
+        return resource in SLOT
+
+    def __iter__(self):
+        return iter(RESOURCES)
+
+    def __len__(self):
+        return RESOURCES_NUM
+
+    def keys(self):
+        return RESOURCES
+
+    def values(self):
+        return self.state.resources[self.base:self.base + RESOURCES_NUM].tolist()
+
+    def items(self):
+        return list(zip(RESOURCES, self.values()))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
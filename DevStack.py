@@ -34,6 +34,18 @@ class YearOfProsper(DevCard):
     name = "year of prosper"
 
 
+# the kinds of development cards, in the order the hands keep them
+CARDS = (KnightCard.name, VictoryPointCard.name, Monopole.name, RoadBuilding.name, YearOfProsper.name)
+CARD_TYPES = {card.name: card for card in (KnightCard, VictoryPointCard, Monopole, RoadBuilding, YearOfProsper)}
+
+
+def create_card(name, ok_to_use):
+    card = CARD_TYPES[name]()
+    if card.ok_to_use != ok_to_use:
+        card.ok_to_use = ok_to_use
+    return card
+
+
 class DevStack:
     def __init__(self):
         self.deck = []
@@ -55,7 +67,18 @@ class DevStack:
             return card
         return None
 
+    def put(self, card):
+        self.deck += [card]
+
     def has_cards(self):
         if len(self.deck) != 0:
             return True
         return False
+
+    # ---- snapshot ---- #
+
+    def snapshot(self):
+        return tuple(card.name for card in self.deck)
+
+    def restore(self, snapshot):
+        self.deck = [CARD_TYPES[name]() for name in snapshot]
@@ -0,0 +1,145 @@
+from array import array
+from collections import deque
+from BoardState import BoardState
+from BoardState import NO_OWNER
+from BoardState import restore_arrays
+
+# ---- global variables ---- #
+
+INFINITY = 100
+
+
+# ---- classes ---- #
+
+
+# distances (in crossroads) from every crossroad to the nearest building of each player, and to the nearest free
+# crossroad a settlement can still be put on (fertility distance). both are multi source bfs over the crossroads graph
+# and after a build only the region whose distances can change is visited again
+class DistanceEngine:
+    def __init__(self, state: BoardState):
+        self.state = state
+        self.neighbors = state.cr_neighbors
+        crossroads_num = state.crossroads_num
+        self.player_dist = [array('b', [INFINITY] * crossroads_num) for _ in range(state.players)]
+        self.fertility = array('b', [INFINITY] * crossroads_num)
+        # the sources the distances were computed from
+        self.owner = array('b', [NO_OWNER] * crossroads_num)
+        self.free = array('b', [0] * crossroads_num)
+        self.compute()
+
+    # ---- snapshot ---- #
+
+    def arrays(self):
+        return tuple(self.player_dist) + (self.fertility, self.owner, self.free)
+
+    def snapshot(self):
+        return b''.join([a.tobytes() for a in self.arrays()])
+
+    def restore(self, snapshot):
+        restore_arrays(self.arrays(), snapshot)
+
+    def is_free(self, cr):
+        return self.state.is_free(cr)
+
+    # full computation from scratch
+    def compute(self):
+        state = self.state
+        for player, dist in enumerate(self.player_dist):
+            sources = []
+            for cr in range(state.crossroads_num):
+                if state.cr_owner[cr] == player:
+                    dist[cr] = 0
+                    sources += [cr]
+                else:
+                    dist[cr] = INFINITY
+            self.decrease(dist, sources)
+        sources = []
+        for cr in range(state.crossroads_num):
+            self.owner[cr] = state.cr_owner[cr]
+            self.free[cr] = 1 if self.is_free(cr) else 0
+            self.fertility[cr] = 0 if self.free[cr] else INFINITY
+            if self.free[cr]:
+                sources += [cr]
+        self.decrease(self.fertility, sources)
+
+    # ---- incremental updates ---- #
+
+    # relax the distances around crossroads whose distance went down
+    def decrease(self, dist, sources):
+        neighbors = self.neighbors
+        queue = deque(sorted(sources, key=dist.__getitem__))
+        while queue:
+            cr = queue.popleft()
+            d = dist[cr] + 1
+            for n in neighbors[cr]:
+                if d < dist[n]:
+                    dist[n] = d
+                    queue.append(n)
+
+    # recompute the region whose shortest paths went through sources that are gone. the region is every crossroad
+    # reachable from the removed sources along strictly increasing distances, it is seeded back from its border
+    def increase(self, dist, removed, is_source):
+        neighbors = self.neighbors
+        region = set(removed)
+        queue = deque(removed)
+        while queue:
+            cr = queue.popleft()
+            for n in neighbors[cr]:
+                if n not in region and dist[n] == dist[cr] + 1:
+                    region.add(n)
+                    queue.append(n)
+        seeds = []
+        for cr in region:
+            if is_source(cr):
+                dist[cr] = 0
+            else:
+                d = INFINITY
+                for n in neighbors[cr]:
+                    if n not in region and dist[n] + 1 < d:
+                        d = dist[n] + 1
+                dist[cr] = d
+            if dist[cr] < INFINITY:
+                seeds += [cr]
+        self.decrease(dist, seeds)
+
+    # a crossroad got built or unbuilt: it may have changed owner, and it and its neighbors may have stopped (or
+    # started) being free
+    def crossroad_changed(self, cr):
+        state = self.state
+        old, new = self.owner[cr], state.cr_owner[cr]
+        if old != new:
+            self.owner[cr] = new
+            if old != NO_OWNER:
+                self.increase(self.player_dist[old], [cr], lambda x: state.cr_owner[x] == old)
+            if new != NO_OWNER:
+                self.player_dist[new][cr] = 0
+                self.decrease(self.player_dist[new], [cr])
+        added, removed = [], []
+        for x in (cr,) + self.neighbors[cr]:
+            free = 1 if self.is_free(x) else 0
+            if free != self.free[x]:
+                self.free[x] = free
+                if free:
+                    added += [x]
+                else:
+                    removed += [x]
+        if removed:
+            self.increase(self.fertility, removed, self.free.__getitem__)
+        if added:
+            for x in added:
+                self.fertility[x] = 0
+            self.decrease(self.fertility, added)
+
+    # ---- queries ---- #
+
+    def distance(self, player, cr):
+        return self.player_dist[player][cr]
+
+    # the free crossroad closest to the buildings of the player, and its distance
+    def nearest_land(self, player):
+        dist = self.player_dist[player]
+        best, best_distance = None, INFINITY
+        for cr in range(self.state.crossroads_num):
+            if self.free[cr] and dist[cr] < best_distance:
+                best, best_distance = cr, dist[cr]
+        return best, best_distance
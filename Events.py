@@ -0,0 +1,290 @@
+from Auxilary import resource_log
+import queue
+import threading
+
+# ---- global variables ---- #
+
+# what AsyncSink does with the events that find its queue full
+BLOCK = 'block'  # wait for the worker, every frame is kept
+COALESCE = 'coalesce'  # apply them later as one batch and only save the last frame of the batch, wait for the
+# worker when the batch reaches MAX_PENDING events
+DROP = 'drop'  # discard them, except the pieces built (bounded by the board), which are applied later as one batch
+# without saving any frame. the next dice and turn events redraw what the discarded ones would have
+MAX_PENDING = 256
+
+
+# ---- events ---- #
+
+
+# every event names the sink method that handles it, so publishing is one getattr per sink. events only hold plain
+# data (no board objects), a sink may keep them or hand them to another thread or process
+class Event:
+    handler = 'event'
+
+
+class TurnStarted(Event):
+    handler = 'turn_started'
+
+    def __init__(self, rnd, turn, player, name, resources):
+        self.round = rnd
+        self.turn = turn
+        self.player = player
+        self.name = name
+        self.resources = resources  # type: dict
+
+
+class DiceThrown(Event):
+    handler = 'dice_thrown'
+
+    def __init__(self, die1, die2, total, resources):
+        self.die1 = die1
+        self.die2 = die2
+        self.total = total
+        self.resources = resources  # type: list[dict]  the resources of every player after the production
+
+
+class ActionApplied(Event):
+    handler = 'action_applied'
+
+    def __init__(self, name, player, log, resources, essentials, regulars, got_point, heuristic=None, note=None):
+        self.name = name
+        self.player = player
+        self.log = log  # type: dict  the action as it is saved in the game log
+        self.resources = resources  # type: dict  the resources of the player after the action
+        self.essentials = essentials
+        self.regulars = regulars
+        self.got_point = got_point
+        self.heuristic = heuristic
+        self.note = note
+
+
+# the resources of a player changed as a side effect of another player's action (monopole, knight)
+class ResourcesChanged(Event):
+    handler = 'resources_changed'
+
+    def __init__(self, player, resources):
+        self.player = player
+        self.resources = resources  # type: dict
+
+
+class TurnEnded(Event):
+    handler = 'turn_ended'
+
+    def __init__(self, rnd, turn):
+        self.round = rnd
+        self.turn = turn
+
+
+class GameOver(Event):
+    handler = 'game_over'
+
+    def __init__(self, winners, rounds, reason):
+        self.winners = winners  # type: list[int]
+        self.rounds = rounds
+        self.reason = reason
+
+
+# ---- sinks ---- #
+
+
+# a sink only overrides the events it cares about
+class Sink:
+    def turn_started(self, event: TurnStarted):
+        pass
+
+    def dice_thrown(self, event: DiceThrown):
+        pass
+
+    def action_applied(self, event: ActionApplied):
+        pass
+
+    def resources_changed(self, event: ResourcesChanged):
+        pass
+
+    def turn_ended(self, event: TurnEnded):
+        pass
+
+    def game_over(self, event: GameOver):
+        pass
+
+    # the game is over and no more events will come
+    def close(self):
+        pass
+
+
+class NullSink(Sink):
+    pass
+
+
+class ConsoleSink(Sink):
+    def turn_started(self, event: TurnStarted):
+        if event.turn == 0:
+            print("\n\n\n")
+            print(event.round)
+            print("\n\n\n")
+
+    def dice_thrown(self, event: DiceThrown):
+        print("dice : " + str(event.total))
+
+    def action_applied(self, event: ActionApplied):
+        print(event.name)
+        if event.heuristic is not None:
+            print(event.heuristic)
+
+    def game_over(self, event: GameOver):
+        if event.reason == 'points':
+            print("player number " + str(event.winners[0]) + " is the winner")
+        else:
+            print(event.reason)
+
+
+# the saved game (see Log)
+class JsonLogSink(Sink):
+    def __init__(self, log):
+        self.log = log
+
+    def turn_started(self, event: TurnStarted):
+        self.log.resources(resource_log(event.resources))
+
+    def dice_thrown(self, event: DiceThrown):
+        self.log.dice(event.total)
+
+    def action_applied(self, event: ActionApplied):
+        self.log.action(event.log)
+
+    def turn_ended(self, event: TurnEnded):
+        self.log.next_turn()
+
+    def game_over(self, event: GameOver):
+        self.log.end_game()
+
+
+class StatisticsSink(Sink):
+    def __init__(self, statistics_logger):
+        self.statistics_logger = statistics_logger
+
+    def action_applied(self, event: ActionApplied):
+        self.statistics_logger.save_action(event.player, event.essentials, event.regulars)
+        if event.got_point:
+            self.statistics_logger.got_point(event.player)
+
+    def game_over(self, event: GameOver):
+        for winner in event.winners:
+            self.statistics_logger.end_game(winner)
+
+
+# an event that changes the board for good (a road, settlement or city), the other events only change text that the
+# next ones redraw
+def is_piece(event: Event):
+    return isinstance(event, ActionApplied) and 'location' in event.log
+
+
+# hands the events of a slow sink (the renderer) to a worker thread through a bounded queue, so the game only waits
+# for it under the block policy. the wrapped sink only runs on the worker thread. a sink with a saving attribute is
+# told which events of a batch should produce a frame
+class AsyncSink(Sink):
+    def __init__(self, sink: Sink, maxsize=64, policy=COALESCE):
+        assert policy in (BLOCK, COALESCE, DROP)
+        self.sink = sink
+        self.policy = policy
+        self.queue = queue.Queue(maxsize)
+        self.pending = []  # events that found the queue full, waiting to be handed over as one batch
+        self.skipped_frames = 0
+        self.dropped_events = 0
+        self.error = None
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def put(self, event: Event):
+        if self.policy == BLOCK:
+            self.queue.put(([event], BLOCK))
+            return
+        self.pending += [event]
+        try:
+            self.queue.put_nowait((self.pending, BLOCK if len(self.pending) == 1 else self.policy))
+            self.pending = []
+        except queue.Full:
+            if self.policy == DROP and not is_piece(event):
+                self.pending.pop()
+                self.dropped_events += 1
+            elif self.policy == COALESCE and len(self.pending) >= MAX_PENDING:
+                self.queue.put((self.pending, COALESCE))
+                self.pending = []
+
+    def run(self):
+        sink = self.sink
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            events, policy = item
+            for i, event in enumerate(events):
+                save = policy == BLOCK or (policy == COALESCE and i == len(events) - 1)
+                if not save:
+                    self.skipped_frames += 1
+                if hasattr(sink, 'saving'):
+                    sink.saving = save
+                try:
+                    getattr(sink, event.handler)(event)
+                except Exception as error:
+                    self.error = error
+
+    def turn_started(self, event: TurnStarted):
+        self.put(event)
+
+    def dice_thrown(self, event: DiceThrown):
+        self.put(event)
+
+    def action_applied(self, event: ActionApplied):
+        self.put(event)
+
+    def resources_changed(self, event: ResourcesChanged):
+        self.put(event)
+
+    def turn_ended(self, event: TurnEnded):
+        self.put(event)
+
+    def game_over(self, event: GameOver):
+        self.put(event)
+
+    # wait for the worker to apply everything, then stop it
+    def close(self):
+        if self.pending:
+            self.queue.put((self.pending, self.policy))
+            self.pending = []
+        self.queue.put(None)
+        self.worker.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
+
+
+# ---- bus ---- #
+
+
+# delivers every event to the sinks in subscription order. publishers check active first, so a bus without sinks
+# does not even build the events
+class EventBus:
+    def __init__(self, sinks=None):
+        self.sinks = []  # type: list[Sink]
+        self.active = False
+        for sink in sinks or []:
+            self.subscribe(sink)
+
+    def subscribe(self, sink: Sink):
+        if not isinstance(sink, NullSink):
+            self.sinks += [sink]
+        self.active = bool(self.sinks)
+
+    def unsubscribe(self, sink: Sink):
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+        self.active = bool(self.sinks)
+
+    def publish(self, event: Event):
+        for sink in self.sinks:
+            getattr(sink, event.handler)(event)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
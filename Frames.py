@@ -0,0 +1,120 @@
+from PIL import Image
+import hashlib
+import io
+import json
+import os
+import shutil
+
+# ---- global variables ---- #
+
+FRAMES_DIR = 'images/destination'
+QUALITY = 85
+
+
+# ---- classes ---- #
+
+
+# one jpeg file per frame, the historical output
+class JpegFrames:
+    def __init__(self, directory=FRAMES_DIR):
+        self.directory = directory
+
+    def write(self, name, image: Image.Image):
+        image.save(os.path.join(self.directory, name + '.jpg'))
+
+    def close(self):
+        pass
+
+
+# every frame of a game in one file: <path>.frames holds the jpeg frames back to back and <path>.index one json line
+# per frame with its name, offset and length. a frame identical to the previous one (same content hash) is only
+# added to the index, pointing at the bytes already written
+class FrameContainer:
+    def __init__(self, path, quality=QUALITY):
+        self.path = path
+        self.quality = quality
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.data = open(path + '.frames', 'wb')
+        self.index = open(path + '.index', 'w')
+        self.offset = 0
+        self.last = None  # hash, offset and length of the previous frame
+        self.frames = 0
+        self.repeats = 0
+
+    def write(self, name, image: Image.Image):
+        digest = hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+        if self.last is not None and self.last[0] == digest:
+            _, offset, length = self.last
+            self.repeats += 1
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=self.quality)
+            offset, length = self.offset, buffer.tell()
+            self.data.write(buffer.getvalue())
+            self.offset += length
+            self.last = (digest, offset, length)
+        self.index.write(json.dumps({'name': name, 'offset': offset, 'length': length}) + '\n')
+        self.frames += 1
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+# ---- functions ---- #
+
+
+def read_index(path):
+    with open(path + '.index') as index:
+        return [json.loads(line) for line in index]
+
+
+# the frames of a container in order, decoded one at a time
+def read_frames(path):
+    with open(path + '.frames', 'rb') as data:
+        for entry in read_index(path):
+            data.seek(entry['offset'])
+            yield entry['name'], Image.open(io.BytesIO(data.read(entry['length'])))
+
+
+# append containers (the parts rendered by different processes) into one, in order
+def merge_containers(parts, path):
+    offset = 0
+    with open(path + '.frames', 'wb') as data, open(path + '.index', 'w') as index:
+        for part in parts:
+            for entry in read_index(part):
+                entry['offset'] += offset
+                index.write(json.dumps(entry) + '\n')
+            with open(part + '.frames', 'rb') as part_data:
+                shutil.copyfileobj(part_data, data)
+            offset = data.tell()
+            os.remove(part + '.frames')
+            os.remove(part + '.index')
+
+
+# an animated webp or gif (by the extension of out) of a container, scaled down. repeated frames are merged into one
+# longer frame
+def export_animation(path, out, scale=0.25, duration=500):
+    frames, durations = [], []
+    previous = None
+    for entry in read_index(path):
+        key = (entry['offset'], entry['length'])
+        if key == previous:
+            durations[-1] += duration
+            continue
+        previous = key
+        frames += [key]
+        durations += [duration]
+
+    def images():
+        with open(path + '.frames', 'rb') as data:
+            for offset, length in frames:
+                data.seek(offset)
+                image = Image.open(io.BytesIO(data.read(length)))
+                yield image.resize((int(image.width * scale), int(image.height * scale)))
+
+    sequence = images()
+    first = next(sequence)
+    first.save(out, save_all=True, append_images=sequence, duration=durations, loop=0)
@@ -1,69 +1,80 @@
-import Actions
 from Player import Player
 from Player import Dork
 from Player import LogToAction
 from Board import Board
 from Log import Log
+from Log import read_game
 from API import API
-from Auxilary import resource_log
+from API import RenderSink
 from Auxilary import next_turn
+from Events import AsyncSink
+from Events import COALESCE
+from Events import ConsoleSink
+from Events import TurnStarted
+from Events import DiceThrown
+from Events import TurnEnded
+from Events import GameOver
+from Frames import FrameContainer
+from Frames import JpegFrames
+from Frames import FRAMES_DIR
 import math
+import os
 from random import randint
-import json
 
 
 class Game:
 
-    def __init__(self, players, board_log=None):
+    # a headless game only keeps the game log and the statistics, without console output or rendered frames. the frames
+    # are drawn by a worker thread, render_policy says what happens when it falls behind (see Events.AsyncSink). the
+    # frames of a game go to one container named like its game log, or to one jpeg each without container (see Frames)
+    def __init__(self, players, board_log=None, headless=False, render_policy=COALESCE, container=True):
         self.round = 0
         self.turn = 0
         self.log = Log(players)
         self.board = self.create_board(players, board_log)
         self.players = self.create_players(players)
         self.players_num = players
-        self.api = API(self.board.get_names())
-        self.api.show_terrain(self.board.map)
-        Actions.api = self.api
+        self.events = self.board.events
+        self.api = None
+        if not headless:
+            if container:
+                name = os.path.splitext(os.path.basename(self.log.game_log_name))[0]
+                frames = FrameContainer(os.path.join(FRAMES_DIR, name))
+            else:
+                frames = JpegFrames()
+            self.api = API(self.board.get_names(), frames=frames)
+            self.api.show_terrain(self.board.map)
+            self.events.subscribe(AsyncSink(RenderSink(self.api), policy=render_policy))
+            self.events.subscribe(ConsoleSink())
 
     def start_game(self):
         for i in range(len(self.players)):
-            self.api.new_turn()
-            self.log.turn_log['resources'] = resource_log(self.players[i].hand)
+            self.start_turn(self.players[i])
             if self.players[i].is_computer:
                 self.players[i].computer_1st_settlement()
             else:
                 pass
             self.next_turn()
-            self.api.end_turn()
         for i in range(len(self.players) - 1, -1, -1):
-            self.api.new_turn_name(self.players[i].name)
-            self.log.turn_log['resources'] = resource_log(self.players[i].hand)
+            self.start_turn(self.players[i])
             if self.players[i].is_computer:
                 self.players[i].computer_2nd_settlement()
             else:
                 pass
             self.next_turn()
-            self.api.end_turn()
-        self.api.round = 1
-        self.api.turn = self.players_num - 1
 
     def play_game(self):
         self.start_game()
         while self.play_round():
             if self.round > 200:
-                print("too many rounds")
-                self.log.end_game()
                 max_points = 0
                 for hand in self.board.hands:
                     if hand.points > max_points:
                         max_points = hand.points
-                for hand in self.board.hands:
-                    if hand.points == max_points:
-                        self.board.statistics_logger.end_game(hand.index)
+                winners = [hand.index for hand in self.board.hands if hand.points == max_points]
+                self.events.publish(GameOver(winners, self.round, "too many rounds"))
+                self.events.close()
                 return
-            print("\n\n\n")
-            print(self.round)
-            print("\n\n\n")
             for hand in self.board.hands:
                 for typeCard in hand.cards.values():
                     if typeCard:
@@ -71,10 +82,9 @@ class Game:
                             card.ok_to_use = True
         for hand in self.board.hands:
             if hand.points >= 10:
-                print("player number " + str(hand.index) + " is the winner")
-                self.log.end_game()
-                self.board.statistics_logger.end_game(hand.index)
-                return
+                self.events.publish(GameOver([hand.index], self.round, 'points'))
+                break
+        self.events.close()
 
     def play_round(self):
         for player in self.players:
@@ -84,9 +94,7 @@ class Game:
         return True
 
     def play_turn(self, player: Player):
-        self.api.end_turn()
-        self.api.new_turn()
-        self.log.turn_log['resources'] = resource_log(player.hand)
+        self.start_turn(player)
         self.throw_dice()
         if self.players[player.index].is_computer:
             while player.compute_turn():
@@ -96,23 +104,30 @@ class Game:
     #     todo human player interface
 
     # Todo: check the order of functions
+    def start_turn(self, player: Player):
+        if self.events.active:
+            self.events.publish(TurnStarted(self.round, self.turn, player.index, player.name,
+                                            dict(player.hand.resources.items())))
+
     def next_turn(self):
+        if self.events.active:
+            self.events.publish(TurnEnded(self.round, self.turn))
         self.round, self.turn = next_turn(self.players_num, self.round, self.turn)
-        self.log.next_turn()
         self.board.next_turn(self.turn, self.round)
 
     def throw_dice(self):
         for i, j in self.board.dice.throw():
             self.board.map[i][j].produce()
-        self.api.show_dice(*self.board.get_dice())
-        for p in self.players:
-            self.api.print_resources(p.index, p.hand.resources)
-        self.api.save_file()
-        self.api.delete_action()
-        self.log.dice(self.board.dice.sum)
+        self.dice_thrown()
         if self.board.dice.sum == 7:
             self.throw_cards()
 
+    def dice_thrown(self):
+        if self.events.active:
+            die1, die2 = self.board.get_dice()
+            resources = [dict(p.hand.resources.items()) for p in self.players]
+            self.events.publish(DiceThrown(die1, die2, self.board.dice.sum, resources))
+
     def throw_cards(self):
         for player in self.players:
             num_cards = sum(player.hand.resources.values())
@@ -123,23 +138,24 @@ class Game:
     def load_game(self, rounds):
         for r, rnd in enumerate(rounds):
             for t, turn in enumerate(rnd['turns']):
-                print("\n\n\n round : " + str(rnd['round']) + " | turn : " + str(turn['turn']))
+                self.round, self.turn = rnd['round'], turn['turn']
+                self.start_turn(self.players[t])
                 if 'dice' in turn:
-                    print("dice : " + str(turn['dice']))
                     self.load_dice(turn['dice'])
-                print("resources : " + str(self.players[t].hand.resources))
                 for i, action in enumerate(turn['actions']):
-                    print(action)
                     player = self.players[action['player']]
                     a = LogToAction(self.board, player, action).get_action()
                     a.do_action()
+                if self.events.active:
+                    self.events.publish(TurnEnded(self.round, self.turn))
                 self.board.next_turn(t, r)
+        self.events.close()
 
     def load_dice(self, num):
         for i, j in self.board.dice.load(num):
             self.board.map[i][j].produce()
-            # Todo: delete save the game option in load mode
-            self.log.dice(self.board.dice.sum)
+        # Todo: delete save the game option in load mode
+        self.dice_thrown()
         if self.board.dice.sum == 7:
             self.throw_cards()
 
@@ -159,7 +175,6 @@ class Game:
         for i in range(num):
             player = Dork(i, self.board)
             players += [player]
-        self.board.api = API(self.board.get_names())
         return players
 
 
@@ -167,10 +182,9 @@ class Game:
 
 
 def load_game(path):
-    with open(path) as json_file:
-        game = json.load(json_file)
-        board = game['board']
-        rounds = game['rounds']
+    game = read_game(path)
+    board = game['board']
+    rounds = game['rounds']
     # Todo: delete comment
     """
     turn_off = False
@@ -4,8 +4,10 @@ from Resources import SETTLEMENT_PRICE
 from Resources import CITY_PRICE
 from Resources import DEV_PRICE
 from DevStack import DevCard
+from DevStack import CARDS
+from DevStack import create_card
+from BoardState import ResourcesView
 from Auxilary import r2s
-import math
 
 
 class Parameters:
@@ -24,7 +26,7 @@ class Hand:
         self.name = None
         self.points = 0
         # ---- hand ---- #
-        self.resources = {Resource.WOOD: 0, Resource.IRON: 0, Resource.WHEAT: 0, Resource.SHEEP: 0, Resource.CLAY: 0}
+        self.resources = ResourcesView(board.state, index)
         self.cards = {"knight": [], "victory points": [], "monopole": [], "road builder": [],
                       "year of prosper": []}  # type: dict[str: list[DevCard]]
         self.road_pieces = 15
@@ -37,7 +39,7 @@ class Hand:
         self.settlements_log = []
         self.cities = []
         # ---- achievements and stats ---- #
-        self.longest_road, self.largest_army = 0, 0
+        self.largest_army = 0
         self.heuristic = 0
         self.production = {Resource.CLAY: 0, Resource.WOOD: 0, Resource.WHEAT: 0, Resource.IRON: 0,
                            Resource.SHEEP: 0}
@@ -48,11 +50,12 @@ class Hand:
 
     # ---- get information ---- #
 
+    @property
+    def longest_road(self):
+        return self.board.longest_roads.length(self.index)
+
     def get_resources_number(self):
-        resource_sum = 0
-        for r in self.resources.values():
-            resource_sum += r
-        return resource_sum
+        return self.board.state.resources_number(self.index)
 
     def get_cards_number(self):
         resource_sum = 0
@@ -61,12 +64,7 @@ class Hand:
         return resource_sum
 
     def get_lands(self):
-        lands = []
-        for line in self.board.crossroads:
-            for cr in line:
-                if cr.connected[self.index] and cr.building == 0 and cr.legal:
-                    lands += [cr]
-        return lands
+        return [self.board.crossroad_list[cr] for cr in self.board.moves.legal_lands(self.index)]
 
     # check if an action can be taken ---- #
 
@@ -102,37 +100,35 @@ class Hand:
     def add_card(self, card: DevCard):
         name = card.get_name()
         self.cards[name] += [card]
+        self.board.state.set_cards(self.index, CARDS.index(name), len(self.cards[name]))
+
+    def remove_card(self, card: DevCard):
+        name = card.get_name()
+        self.cards[name].remove(card)
+        self.board.state.set_cards(self.index, CARDS.index(name), len(self.cards[name]))
 
     def subtract_point(self):
         self.points -= 1
 
-    def set_distances(self):
-        stack = []
-        stack_fert = []
-        for line in self.board.crossroads:
-            for cr in line:
-                cr.fertility_dist = math.inf
-                if cr.ownership is not None:
-                    cr.distance[cr.ownership] = 0
-                    stack.extend(x.crossroad for x in cr.neighbors if x.crossroad not in stack)
-                else:
-                    if cr.legal:
-                        cr.fertility_dist = 0
-        while stack:
-            cr = stack.pop()
-            for n in cr.neighbors:
-                ncr = n.crossroad
-                for i in range(self.board.players):
-                    if cr.distance[i] > ncr.distance[i] + 1:
-                        cr.distance[i] = ncr.distance[i] + 1
-                        stack.extend(x.crossroad for x in cr.neighbors if x.crossroad not in stack)
-        while stack_fert:
-            cr = stack_fert.pop()
-            for n in cr.neighbors:
-                ncr = n.crossroad
-                if cr.fertility_dist > ncr.fertility_dist + 1:
-                    cr.fertility_dist = ncr.fertility_dist + 1
-                    stack_fert.extend(x.crossroad for x in cr.neighbors if x.crossroad not in stack)
+    # ---- snapshot, crossroads are kept by their index ---- #
+
+    def snapshot(self):
+        return (self.points, self.road_pieces, self.settlement_pieces, self.city_pieces, frozenset(self.ports),
+                [cr.index for cr in self.lands_log], [cr.index for cr in self.settlements_log],
+                [cr.index for cr in self.cities], self.largest_army, self.heuristic, self.production.copy(),
+                self.production_all, [(name, [card.ok_to_use for card in cards]) for name, cards in self.cards.items()])
+
+    def restore(self, snapshot):
+        crossroads = self.board.crossroad_list
+        (self.points, self.road_pieces, self.settlement_pieces, self.city_pieces, ports, lands_log, settlements_log,
+         cities, self.largest_army, self.heuristic, production, self.production_all, cards) = snapshot
+        self.ports = set(ports)
+        self.lands_log = [crossroads[cr] for cr in lands_log]
+        self.settlements_log = [crossroads[cr] for cr in settlements_log]
+        self.cities = [crossroads[cr] for cr in cities]
+        self.production = production.copy()
+        for name, flags in cards:
+            self.cards[name] = [create_card(name, ok_to_use) for ok_to_use in flags]
 
     def can_pay(self, price):
         for resource in price:
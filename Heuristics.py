@@ -1,13 +1,16 @@
 from Actions import Action
+from Actions import Trade
+from Actions import UseKnight
+from Actions import UseYearOfPlenty
 from Board import Board
 from Board import Terrain
 from Log import StatisticsLogger
 from Resources import Resource
-from Auxilary import r2s
 import json
 from typing import List
 from random import uniform
 from Hand import Hand
+import math
 
 
 class SimpleHeuristic:
@@ -59,6 +62,7 @@ class StatisticsHeuristic:
 
 
 def best_action(actions: List[Action]):
+    score_actions(actions)
     ba = actions.pop() if actions else None
     while actions:
         a = actions.pop()
@@ -80,24 +84,17 @@ def hand_stat(hand: Hand):
     stat = hand.points
     for resource in Resource:
         if resource != Resource.DESSERT:
-            val = hand.resources[resource] * 12
-            print(r2s(resource) + ' score : ' + str(val))
             stat += hand.resources[resource] * 0.12
-    val = stat
     for v in hand.cards.values():
         stat += len(v) * 0.4
-    val = stat - val
-    print('development cards score : ' + str(val))
     if hand.index != hand.board.longest_road_owner:
         road_value = 2 - 0.3 * (hand.board.longest_road_size + 1 - hand.longest_road)
         if road_value > 0:
             stat += road_value
-            print('longest road score : ' + str(road_value))
     if hand.index != hand.board.largest_army_owner:
         army_value = 2 - 0.5 * (hand.board.largest_army_size - hand.largest_army)
         if army_value > 0:
             stat += army_value
-            print('largest army score : ' + str(army_value))
     return stat
 
 
@@ -106,8 +103,58 @@ def hand_heuristic(action: Action):
     undo_info = action.do_action()
     value = hand_stat(action.hand)
     action.undo(undo_info)
-    after = hand_stat(action.hand)
-    if after == value:
-        print("this is quite fishy")
     action.evaluation_off()
     return value
+
+
+# ---- batch scoring ---- #
+
+
+# candidates that can not be better than doing nothing: trading a resource for itself, or a knight that neither
+# unlocks the production of its player, blocks the production of another player nor steals from its target
+def is_pointless(action: Action):
+    if isinstance(action, Trade):
+        return action.src is action.dst
+    if isinstance(action, UseKnight):
+        locked, _ = action.board.bandit_location.bandit_value(action.index)
+        still_locked, blocked = action.terrain.bandit_value(action.index)
+        return locked <= still_locked and blocked == 0 and action.hands[action.dst].get_resources_number() == 0
+    return False
+
+
+# candidates with the same key end in the same position and share one score
+def outcome_key(action: Action):
+    if isinstance(action, UseYearOfPlenty):
+        return action.name, frozenset((action.resource1, action.resource2))
+    return None
+
+
+# score a list of candidates together. pointless candidates are not scored, candidates with the same outcome are
+# scored once, and the hand_heuristic ones are evaluated on a board snapshot taken once and restored after each
+# candidate instead of undoing it
+def score_actions(actions: List[Action]):
+    if not actions:
+        return
+    board = actions[0].board
+    snapshot = None
+    scores = {}
+    for action in actions:
+        if action.heuristic_value is not None:
+            continue
+        if is_pointless(action):
+            action.heuristic = -math.inf
+            continue
+        key = outcome_key(action)
+        if key is not None and key in scores:
+            action.heuristic = scores[key]
+            continue
+        if action.heuristic_method is hand_heuristic:
+            if snapshot is None:
+                snapshot = board.snapshot()
+            action.evaluation_on()
+            action.do_action()
+            action.heuristic = hand_stat(action.hand)
+            action.evaluation_off()
+            board.restore(snapshot)
+        if key is not None:
+            scores[key] = action.heuristic
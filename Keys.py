@@ -0,0 +1,79 @@
+from Resources import Resource
+from Auxilary import r2s
+import math
+
+# ---- classes ---- #
+
+
+# a feature of the statistics keys of an action (Action.create_keys). a key is the small tuple (feature id, value),
+# built without any string. numeric values are kept as they are, or as the lower end of their bucket when the feature
+# has a bucket width, and word values (names) are interned to an integer in the feature. the text of a key
+# ('points : 3', 'all production : 8..12' for a bucket) is only rendered when the statistics are serialized (see
+# render). set the bucket of a feature before any key of it is built
+class Feature:
+    def __init__(self, label, words=False, bucket=None):
+        self.id = len(features)
+        self.label = label  # None for a bare word key (the action name)
+        self.words = {} if words else None  # type: dict[str, int]
+        self.texts = []  # type: list[str]  the interned words by their integer
+        self.bucket = bucket
+        features.append(self)
+
+    def __call__(self, value):
+        if self.bucket is not None:
+            value = math.floor(value / self.bucket) * self.bucket
+        elif self.words is not None:
+            word = self.words.get(value)
+            if word is None:
+                word = self.words[value] = len(self.texts)
+                self.texts += [value]
+            value = word
+        return self.id, value
+
+    def render(self, value) -> str:
+        if self.bucket is not None:
+            value = bucket_text(value, self.bucket)
+        elif self.words is not None:
+            value = self.texts[value]
+        return str(value) if self.label is None else self.label + ' : ' + str(value)
+
+
+# ---- functions ---- #
+
+
+# the text of a key, rendered once per process
+def render(key) -> str:
+    text = texts.get(key)
+    if text is None:
+        text = texts[key] = features[key[0]].render(key[1])
+    return text
+
+
+def render_all(keys) -> tuple:
+    return tuple(render(key) for key in keys)
+
+
+def number_text(number) -> str:
+    return str(int(number)) if number == int(number) else '%g' % number
+
+
+# the values from low up to (without) low + width
+def bucket_text(low, width) -> str:
+    return number_text(low) + BUCKET_SEPARATOR + number_text(low + width)
+
+
+# ---- global variables ---- #
+
+BUCKET_SEPARATOR = '..'
+features = []  # type: list[Feature]  the intern table of the process, by feature id
+texts = {}  # type: dict[tuple, str]
+
+ACTION = Feature(None, words=True)
+POINTS = Feature('points')
+PLAYER = Feature('player', words=True)
+UNLOCK_PRODUCTION = Feature('unlock my production')
+LOCK_PRODUCTION = Feature('lock there production')
+CARDS_I_GET = Feature('cards i get')
+ALL_PRODUCTION = Feature('all production')
+RESOURCE_PRODUCTION = [(resource, Feature(r2s(resource))) for resource in Resource if resource != Resource.DESSERT]
+EXCHANGE_RATE = Feature('exchange rate')
@@ -1,173 +1,410 @@
+from Auxilary import next_turn
+from array import array
+from Statistics import StatisticsStore
+from Statistics import STATISTICS_DB
+from Keys import render
+from Keys import render_all
+import atexit
+import fcntl
+import itertools
 import json
+import os
+import time
 from random import uniform
 
+# ---- global variables ---- #
 
+SAVED_GAMES = 'saved_games'
+INDEX = os.path.join(SAVED_GAMES, 'index.jsonl')
+games_created = itertools.count(1)  # the games this process created
+TRACKING = 'tracking_development.json'
+RESOLUTIONS = (1, 10, 100)
+FLUSH_GAMES = 50
+FLUSH_SECONDS = 60
+MERGE_GAMES = 20
+MERGE_SECONDS = 60
+
+
+# the saved game, streamed to a json lines file as the game goes: every event is one line, written through a buffered
+# file that is flushed at the end of each turn, so memory does not grow with the game and a killed game keeps every
+# finished turn. read_game rebuilds the nested game log (rounds of turns of actions) from it
 class Log:
     def __init__(self, players):
         self.round = 0
         self.turn = 0
         self.players = players
 
-        self.turn_log = {'turn': 0, 'actions': []}
-        self.round_log = {'round': 0, 'turns': []}
-        self.game_log = {'number of players': players, 'rounds': []}
         self.game_log_name = self.create_file_name()
+        self.file = open(self.game_log_name, 'x')
+        self.write({'event': 'game', 'number of players': players})
 
         self.statistic = {}
 
+    def write(self, line):
+        self.file.write(json.dumps(line) + '\n')
+
     def next_turn(self):
-        self.round_log['turns'] += [self.turn_log]
-        if self.turn == self.players - 1:
-            self.turn = 0
-            self.round += 1
-            self.game_log['rounds'] += [self.round_log]
-            self.round_log = {'round': self.round, 'turns': []}
-        else:
-            self.turn += 1
-        self.turn_log = {'turn': self.turn, 'actions': []}
+        self.write({'event': 'next turn'})
+        self.file.flush()
+        self.round, self.turn = next_turn(self.players, self.round, self.turn)
+
+    # the resources of the player at the start of the turn
+    def resources(self, resources):
+        self.write({'event': 'resources', 'resources': resources})
 
     def dice(self, dice):
-        self.turn_log['dice'] = dice
+        self.write({'event': 'dice', 'dice': dice})
 
     def action(self, action_log):
-        self.turn_log['actions'] += [action_log]
+        self.write({'event': 'action', 'action': action_log})
 
     def end_game(self):
-        with open(self.game_log_name, 'w') as outfile:
-            json.dump(self.game_log, outfile)
-        self.track_development(1)
-        self.track_development(10)
-        self.track_development(100)
-
-    def track_development(self, res):
-        stop = res
-        res = str(res)
-        with open('tracking_development.json') as json_file:
-            tracker = json.load(json_file)
-            if res not in tracker['resolution']:
-                tracker['resolution'][res] = {'counter': 0, 'sum': 0, 'games': []}
-            counter = tracker['resolution'][res]['counter']
-            sum = tracker['resolution'][res]['sum']
-            counter += 1
-            sum += self.round
-            if counter >= stop:
-                tracker['resolution'][res]['games'] += [sum / counter]
-                counter = 0
-                sum = 0
-            tracker['resolution'][res]['counter'] = counter
-            tracker['resolution'][res]['sum'] = sum
-        with open('tracking_development.json', 'w') as outfile:
-            json.dump(tracker, outfile)
+        self.write({'event': 'end game', 'round': self.round})
+        self.file.close()
+        development.add(self.round)
 
     def board(self, board_log):
-        self.game_log['board'] = board_log
+        self.write({'event': 'board', 'board': board_log})
+        self.file.flush()
 
+    # a game id is unique without any shared state: the creation time, the process id and a per process counter (two
+    # processes alive together never share a pid, a process never repeats a count). the game is then announced by one
+    # appended line in the index, which concurrent games can do together (see compact_index)
     @staticmethod
     def create_file_name():
-        with open("saved_games/manager.json") as json_file:
-            manager = json.load(json_file)
-        name = "saved_games/game" + str(manager['games saved'] + 1) + ".json"
-        manager['games saved'] += 1
-        with open("saved_games/manager.json", 'w') as outfile:
-            json.dump(manager, outfile)
+        game_id = 'game-%s-%d-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(games_created))
+        name = os.path.join(SAVED_GAMES, game_id + '.jsonl')
+        append_index({'id': game_id, 'file': name, 'created': time.time()})
         return name
 
 
+# ---- development tracking ---- #
+
+
+# the rolling average game length in tracking_development.json, for every resolution the average of each block of
+# that many games. the games of a process are kept in memory and applied to the file in one batch every FLUSH_GAMES
+# games or FLUSH_SECONDS seconds, and at exit. a batch is applied under an exclusive lock and the file is replaced
+# atomically, so the batches of concurrent processes add up as if their games had finished one after the other.
+# processes that leave without running atexit (the workers of a terminated pool) should call flush themselves
+class DevelopmentTracker:
+    def __init__(self, path=TRACKING, flush_games=FLUSH_GAMES, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.flush_games = flush_games
+        self.flush_seconds = flush_seconds
+        self.rounds = []  # type: list[int]  the length of the games not flushed yet
+        self.last_flush = time.time()
+        self.pid = os.getpid()
+        atexit.register(self.flush)
+
+    def add(self, rounds):
+        if self.pid != os.getpid():
+            # a forked process inherits the games of its parent, the parent flushes them
+            self.rounds, self.pid = [], os.getpid()
+        self.rounds += [rounds]
+        if len(self.rounds) >= self.flush_games or time.time() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.time()
+        if not self.rounds or self.pid != os.getpid():
+            return
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(self.path):
+                with open(self.path) as json_file:
+                    tracker = json.load(json_file)
+            else:
+                tracker = {'resolution': {}}
+            for rounds in self.rounds:
+                for res in RESOLUTIONS:
+                    track(tracker, res, rounds)
+            temporary = self.path + '.%d.tmp' % os.getpid()
+            with open(temporary, 'w') as outfile:
+                json.dump(tracker, outfile)
+            os.replace(temporary, self.path)
+        self.rounds = []
+
+
+def track(tracker, stop, rounds):
+    res = str(stop)
+    if res not in tracker['resolution']:
+        tracker['resolution'][res] = {'counter': 0, 'sum': 0, 'games': []}
+    resolution = tracker['resolution'][res]
+    resolution['counter'] += 1
+    resolution['sum'] += rounds
+    if resolution['counter'] >= stop:
+        resolution['games'] += [resolution['sum'] / resolution['counter']]
+        resolution['counter'] = 0
+        resolution['sum'] = 0
+
+
+development = DevelopmentTracker()
+
+
+# ---- saved games index ---- #
+
+
+# one short line in one write to a file opened for appending, so lines of concurrent processes do not mix
+def append_index(entry):
+    fd = os.open(INDEX, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(entry) + '\n').encode())
+    finally:
+        os.close(fd)
+
+
+def read_index():
+    if not os.path.exists(INDEX):
+        return []
+    entries = []
+    with open(INDEX) as index:
+        for line in index:
+            try:
+                entries += [json.loads(line)]
+            except ValueError:
+                pass
+    return entries
+
+
+# rewrite the index in creation order, without the games whose file is gone and with the saved games it misses (the
+# numbered games of the old manager.json counter). the new index replaces the old one atomically, but lines appended
+# while it runs are lost, so only compact it when no game is being played
+def compact_index():
+    entries = {}
+    for entry in read_index():
+        if os.path.exists(entry['file']):
+            entries[entry['id']] = entry
+    files = {entry['file'] for entry in entries.values()}
+    for name in os.listdir(SAVED_GAMES):
+        path = os.path.join(SAVED_GAMES, name)
+        game_id, extension = os.path.splitext(name)
+        if name.startswith('game') and extension in ('.json', '.jsonl') and path not in files:
+            entries[game_id] = {'id': game_id, 'file': path, 'created': os.path.getmtime(path)}
+    temporary = INDEX + '.%d.tmp' % os.getpid()
+    with open(temporary, 'w') as outfile:
+        for entry in sorted(entries.values(), key=lambda e: e['created']):
+            outfile.write(json.dumps(entry) + '\n')
+    os.replace(temporary, INDEX)
+    return len(entries)
+
+
+# the nested game log of a saved game: {'number of players', 'board', 'rounds': [{'round', 'turns': [{'turn',
+# 'resources', 'dice', 'actions'}]}]}. the turns of an unfinished round (the last one, or a killed game) are kept.
+# games saved before the json lines log are read as they are
+def read_game(path):
+    if not path.endswith('.jsonl'):
+        with open(path) as json_file:
+            return json.load(json_file)
+    game_log = {'rounds': []}
+    rnd, turn = 0, 0
+    round_log = {'round': rnd, 'turns': []}
+    turn_log = {'turn': turn, 'actions': []}
+    with open(path) as json_file:
+        for line in json_file:
+            try:
+                line = json.loads(line)
+            except ValueError:
+                break  # the last line of a killed game may be cut
+            event = line['event']
+            if event == 'action':
+                turn_log['actions'] += [line['action']]
+            elif event == 'next turn':
+                round_log['turns'] += [turn_log]
+                rnd, turn = next_turn(game_log['number of players'], rnd, turn)
+                if rnd != round_log['round']:
+                    game_log['rounds'] += [round_log]
+                    round_log = {'round': rnd, 'turns': []}
+                turn_log = {'turn': turn, 'actions': []}
+            elif event in ('resources', 'dice'):
+                turn_log[event] = line[event]
+            elif event in ('game', 'board'):
+                del line['event']
+                game_log.update(line)
+    if round_log['turns']:
+        game_log['rounds'] += [round_log]
+    return game_log
+
+
+# ---- statistics ---- #
+
+
+# the statistics this process added since it last wrote them, as flat counters by (essentials, regular) of interned
+# keys (see Keys and Statistics). the keys are rendered to text when they are written to the store, as one batch of
+# upserts every MERGE_GAMES games or MERGE_SECONDS seconds and at exit. the counters only add up, so the batches of
+# concurrent processes never overwrite each other
+class StatisticsShard:
+    def __init__(self, merge_games=MERGE_GAMES, merge_seconds=MERGE_SECONDS):
+        self.merge_games = merge_games
+        self.merge_seconds = merge_seconds
+        self.events = {}  # type: dict[tuple, list[int]]  events and wins by (essentials, regular)
+        self.actions_to_point = {}  # type: dict[tuple, dict[int, int]]
+        self.games = 0
+        self.last_merge = time.time()
+        self.pid = os.getpid()
+        atexit.register(self.merge)
+
+    def own(self):
+        if self.pid != os.getpid():
+            # a forked process inherits the shard of its parent, the parent writes it
+            self.events, self.actions_to_point, self.games, self.pid = {}, {}, 0, os.getpid()
+
+    def add_events(self, essentials, regular, events, wins):
+        self.own()
+        counters = self.events.setdefault((tuple(essentials), regular), [0, 0])
+        counters[0] += events
+        counters[1] += wins
+
+    def add_action_to_point(self, essentials, regular, actions, count=1):
+        self.own()
+        counters = self.actions_to_point.setdefault((tuple(essentials), regular), {})
+        counters[actions] = counters.get(actions, 0) + count
+
+    def end_game(self):
+        self.own()
+        self.games += 1
+        if self.games >= self.merge_games or time.time() - self.last_merge >= self.merge_seconds:
+            self.merge()
+
+    # a read only store drops the counters
+    def merge(self):
+        self.last_merge = time.time()
+        if self.pid != os.getpid():
+            return
+        if (self.events or self.actions_to_point) and not statistics_store().readonly:
+            events, actions_to_point = {}, {}
+            for (essentials, regular), (e, w) in self.events.items():
+                counters = events.setdefault(rendered(essentials, regular), [0, 0])
+                counters[0] += e
+                counters[1] += w
+            for (essentials, regular), counts in self.actions_to_point.items():
+                counters = actions_to_point.setdefault(rendered(essentials, regular), {})
+                for actions, count in counts.items():
+                    counters[actions] = counters.get(actions, 0) + count
+            statistics_store().upsert(events, actions_to_point)
+        self.events, self.actions_to_point, self.games = {}, {}, 0
+
+
+# the statistics store of the process, opened on first use (and again in a forked process, sqlite connections do not
+# survive a fork). workers that must not write the statistics open it read only first
+def open_statistics(path=STATISTICS_DB, readonly=False):
+    global store
+    store = StatisticsStore(path, readonly)
+    return store
+
+
+def statistics_store() -> StatisticsStore:
+    if store is None or store.pid != os.getpid():
+        open_statistics()
+    return store
+
+
+# the statistics nodes an action counts in: every prefix of its essential keys, and each of its regular keys under
+# all of them
+def statistics_nodes(essentials, regulars):
+    for n in range(1, len(essentials) + 1):
+        yield essentials[:n], None
+    for key in regulars:
+        yield essentials, key
+
+
+# the text of a statistics node of interned keys
+def rendered(essentials, regular=None):
+    return render_all(essentials), render(regular) if regular is not None else None
+
+
+store = None  # type: StatisticsStore
+shard = StatisticsShard()
+
+
+# the statistics of one game. an action is interned to a signature (its essential and regular keys) when it is saved,
+# and the game only counts signatures: how many times each player played each one, and for every point how many
+# times each one was played that many actions before it. only the actions since the last point of each player are
+# kept, as an array of signature ids. the signatures are expanded to their statistics nodes once, when the game ends
 class StatisticsLogger:
     def __init__(self):
-        self.actions = []
-        with open("statistics.json") as json_file:
-            self.statistics = json.load(json_file)
-        self.actions_to_point = {}
+        self.signatures = {}  # type: dict[tuple, int]
+        self.keys = []  # type: list[tuple]  the essentials and regulars of each signature
+        self.played = {}  # type: dict[tuple[int, int], int]  by (signature, player)
+        self.since_point = {}  # type: dict[int, array]  the signatures each player played since its last point
+        self.to_point = {}  # type: dict[tuple[int, int], int]  by (signature, actions to point)
 
     def save_action(self, index, e_keys, r_keys):
-        if index not in self.actions_to_point:
-            self.actions_to_point[index] = []
-        self.actions += [(index, e_keys, r_keys)]
-        self.actions_to_point[index] += [(e_keys, r_keys)]
+        key = (tuple(e_keys), tuple(r_keys))
+        signature = self.signatures.get(key)
+        if signature is None:
+            signature = self.signatures[key] = len(self.keys)
+            self.keys += [key]
+        self.played[(signature, index)] = self.played.get((signature, index), 0) + 1
+        if index not in self.since_point:
+            self.since_point[index] = array('i')
+        self.since_point[index].append(signature)
 
     def got_point(self, index):
-        for i, action in enumerate(self.actions_to_point[index][::-1]):
-            e_keys, r_keys = action
-            pointer = self.statistics['actions']
-            for key in e_keys:
-                key = str(key)
-                if key not in pointer:
-                    pointer[key] = {'events': 0, 'wins': 0}
-                if 'actions to point' not in pointer[key]:
-                    pointer[key]['actions to point'] = {}
-                if str(i + 1) not in pointer[key]['actions to point']:
-                    pointer[key]['actions to point'][str(i + 1)] = 0
-                pointer[key]['actions to point'][str(i + 1)] += 1
-                pointer = pointer[key]
-            for key in r_keys:
-                key = str(key)
-                if key not in pointer:
-                    pointer[key] = {'events': 0, 'wins': 0}
-                if 'actions to point' not in pointer[key]:
-                    pointer[key]['actions to point'] = {}
-                if str(i + 1) not in pointer[key]['actions to point']:
-                    pointer[key]['actions to point'][str(i + 1)] = 0
-                pointer[key]['actions to point'][str(i + 1)] += 1
-        self.actions_to_point[index] = []
+        since_point = self.since_point.get(index, ())
+        for i, signature in enumerate(reversed(since_point)):
+            self.to_point[(signature, i + 1)] = self.to_point.get((signature, i + 1), 0) + 1
+        self.since_point[index] = array('i')
 
+    # every winner counts the actions of the game again
     def end_game(self, winner):
-        for action in self.actions:
-            index, e_keys, r_keys = action
-            win = 1 if winner == index else 0
-            pointer = self.statistics['actions']
-            for key in e_keys:
-                key = str(key)
-                if key in pointer:
-                    pointer[key]['events'] += 1
-                    pointer[key]['wins'] += win
-                else:
-                    pointer[key] = {'events': 1, 'wins': win}
-                pointer = pointer[key]
-            for key in r_keys:
-                if key in pointer:
-                    pointer[key]['events'] += 1
-                    pointer[key]['wins'] += win
-                else:
-                    pointer[key] = {'events': 1, 'wins': win}
-        with open('statistics.json', 'w') as out_file:
-            json.dump(self.statistics, out_file)
+        for (signature, index), count in self.played.items():
+            win = count if winner == index else 0
+            for essentials, regular in statistics_nodes(*self.keys[signature]):
+                shard.add_events(essentials, regular, count, win)
+        for (signature, actions), count in self.to_point.items():
+            for essentials, regular in statistics_nodes(*self.keys[signature]):
+                shard.add_action_to_point(essentials, regular, actions, count)
+        self.to_point = {}
+        shard.end_game()
 
+    # the stored counters of a node plus the ones of this process that are not written yet
+    @staticmethod
+    def events(essentials, regular=None):
+        stored = statistics_store().events(*rendered(essentials, regular))
+        pending = shard.events.get((tuple(essentials), regular))
+        if pending is None:
+            return stored
+        if stored is None:
+            return tuple(pending)
+        return stored[0] + pending[0], stored[1] + pending[1]
+
+    @staticmethod
+    def actions_to_point_counts(essentials, regular=None):
+        counts = dict(statistics_store().actions_to_point(*rendered(essentials, regular)))
+        for actions, count in shard.actions_to_point.get((tuple(essentials), regular), {}).items():
+            counts[actions] = counts.get(actions, 0) + count
+        return counts
+
+    # a regular key the statistics never saw is left out, without any seen regular key the ratio is a guess
     def get_statistic(self, essentials, regulars):
-        pointer = self.statistics['actions']
-        for key in essentials:
-            if key in pointer:
-                pointer = pointer[key]
-            else:
-                return uniform(0, 0.66)
+        node = self.events(essentials)
+        if node is None:
+            return uniform(0, 0.66)
+        total_events, total_wins = node
         statistics = []
         for key in regulars:
-            total_events = pointer['events']
-            total_wins = pointer['wins']
-            events = pointer[key]['events']
-            wins = pointer[key]['wins']
-            statistics += [Statistic(events, wins, total_wins, total_events - total_wins)]
+            regular = self.events(essentials, key)
+            if regular is not None:
+                events, wins = regular
+                statistics += [Statistic(events, wins, total_wins, total_events - total_wins)]
+        if not statistics:
+            return uniform(0, 0.66)
         st = statistics_merge(statistics)   # type: Statistic
         events = st.event
         wins = st.win
         return wins / events
 
     def get_actions_to_point(self, essentials, regulars):
-        pointer = self.statistics['actions']
-        for key in essentials:
-            if key in pointer:
-                pointer = pointer[key]
-            else:
-                return 4
+        if self.events(essentials) is None:
+            return 4
         sum_actions = 0
         sum_actions_to_point = 0
-        for k, v in pointer['actions to point'].items:
-            sum_actions += v
-            sum_actions_to_point += k * v
-        for key in regulars:
-            for k, v in pointer[key]['actions to point'].items:
+        for key in [None] + list(regulars):
+            for k, v in self.actions_to_point_counts(essentials, key).items():
                 sum_actions += v
                 sum_actions_to_point += k * v
+        if not sum_actions:
+            return 4
         return sum_actions_to_point / sum_actions
 
 
@@ -0,0 +1,128 @@
+from BoardState import BoardState
+from BoardState import NO_OWNER
+
+
+# exact longest road of every player. each player's roads are kept as components (roads connected through crossroads
+# that no other player has built on), and only the components around a changed road or crossroad are computed again.
+# the longest trail of a component is cached by its roads, so building a road and undoing it goes back to the cached
+# values without another search
+class LongestRoadEngine:
+    def __init__(self, state: BoardState):
+        self.state = state
+        players = state.players
+        self.component = [{} for _ in range(players)]  # type: list[dict[int, frozenset]]
+        self.lengths = [{} for _ in range(players)]  # type: list[dict[frozenset, int]]
+        self.longest = [0] * players
+        self.cache = {}  # type: dict[tuple[frozenset, frozenset], int]
+
+    # ---- snapshot (the cache stays, it is valid for every position) ---- #
+
+    def snapshot(self):
+        return [c.copy() for c in self.component], [lengths.copy() for lengths in self.lengths], self.longest.copy()
+
+    def restore(self, snapshot):
+        component, lengths, longest = snapshot
+        self.component = [c.copy() for c in component]
+        self.lengths = [player_lengths.copy() for player_lengths in lengths]
+        self.longest = longest.copy()
+
+    # ---- queries ---- #
+
+    def length(self, player):
+        return self.longest[player]
+
+    def component_length(self, player, road):
+        roads = self.component[player].get(road)
+        return 0 if roads is None else self.lengths[player][roads]
+
+    # ---- maintenance ---- #
+
+    def road_changed(self, road, player):
+        self.refresh(player, self.state.road_ends[road], [road])
+
+    def crossroad_changed(self, cr):
+        for player in range(self.state.players):
+            self.refresh(player, (cr,), [])
+
+    def blocks(self, cr, player):
+        owner = self.state.cr_owner[cr]
+        return owner != NO_OWNER and owner != player
+
+    # recompute the components of the player around the given crossroads
+    def refresh(self, player, crossroads, roads):
+        state = self.state
+        component, lengths = self.component[player], self.lengths[player]
+        seeds = set(roads)
+        for cr in crossroads:
+            for road in state.cr_roads[cr]:
+                if road in component or state.road_owner[road] == player:
+                    seeds.add(road)
+        if not seeds:
+            return
+        # forget the old components
+        for road in list(seeds):
+            old = component.get(road)
+            if old is not None and old in lengths:
+                del lengths[old]
+                for r in old:
+                    del component[r]
+                    seeds.add(r)
+        # build the new ones
+        for road in seeds:
+            if road in component or state.road_owner[road] != player:
+                continue
+            roads, blocked = self.collect(player, road)
+            key = (roads, blocked)
+            if key not in self.cache:
+                self.cache[key] = self.longest_trail(roads, blocked)
+            lengths[roads] = self.cache[key]
+            for r in roads:
+                component[r] = roads
+        self.longest[player] = max(lengths.values(), default=0)
+
+    # the roads of the player connected to road, and the crossroads of other players two of them meet at
+    def collect(self, player, road):
+        state = self.state
+        roads = {road}
+        blocked = set()
+        stack = [road]
+        while stack:
+            r = stack.pop()
+            for cr in state.road_ends[r]:
+                if self.blocks(cr, player):
+                    continue
+                for other in state.cr_roads[cr]:
+                    if other not in roads and state.road_owner[other] == player:
+                        roads.add(other)
+                        stack.append(other)
+        for r in roads:
+            for cr in state.road_ends[r]:
+                if self.blocks(cr, player):
+                    blocked.add(cr)
+        return frozenset(roads), frozenset(blocked)
+
+    # ---- longest trail of one component ---- #
+
+    def longest_trail(self, roads, blocked):
+        adjacent = {}
+        for road in roads:
+            u, v = self.state.road_ends[road]
+            adjacent.setdefault(u, []).append((road, v))
+            adjacent.setdefault(v, []).append((road, u))
+        longest = 0
+        used = set()
+        for cr in adjacent:
+            longest = max(longest, self.walk(adjacent, blocked, used, cr, 0))
+        return longest
+
+    def walk(self, adjacent, blocked, used, cr, length):
+        # a trail can end on a crossroad of another player, but not pass through it
+        if length and cr in blocked:
+            return length
+        longest = length
+        for road, other in adjacent[cr]:
+            if road not in used:
+                used.add(road)
+                longest = max(longest, self.walk(adjacent, blocked, used, other, length + 1))
+                used.discard(road)
+        return longest
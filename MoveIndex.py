@@ -0,0 +1,40 @@
+from BoardState import BoardState
+from Topology import bits
+
+
+# the buildable roads, buildable lands and upgradable settlements of each player, plus the free crossroads of the
+# opening. they are read straight from the bitboards of the board state, which the setters keep up to date, so there
+# is nothing to maintain or snapshot here
+class MoveIndex:
+    def __init__(self, state: BoardState):
+        self.state = state
+
+    # ---- queries, in board order ---- #
+
+    def legal_roads(self, player):
+        return list(bits(self.state.legal_roads(player)))
+
+    def legal_lands(self, player):
+        return list(bits(self.state.lands(player)))
+
+    def upgradable_settlements(self, player):
+        return list(bits(self.state.settlements(player)))
+
+    def free_crossroads(self):
+        return list(bits(self.state.free_crossroads()))
+
+    # every unordered pair of roads the player can build one after the other (road builder card), each pair once.
+    # the second road is either another road of the frontier or a road leaving a crossroad the first road connects,
+    # so the board is never built on
+    def road_pairs(self, player):
+        state = self.state
+        frontier = state.legal_roads(player)
+        connected = state.connected[player]
+        for road1 in bits(frontier):
+            for road2 in bits(frontier >> (road1 + 1) << (road1 + 1)):
+                yield road1, road2
+            extension = 0
+            for cr in bits(state.road_end_masks[road1] & ~connected):
+                extension |= state.cr_road_masks[cr]
+            for road2 in bits(extension & ~frontier & ~state.roads & ~(1 << road1)):
+                yield road1, road2
@@ -3,6 +3,7 @@ from Heuristics import StatisticsHeuristic
 from Heuristics import best_action
 from Heuristics import greatest_crossroad
 from Heuristics import hand_heuristic
+from Heuristics import score_actions
 from Actions import Trade
 from Actions import BuildFreeRoad
 from Actions import BuildRoad
@@ -72,6 +73,7 @@ class LogToAction:
 
 
 def take_best_action(actions):
+    score_actions(actions)
     if actions:
         baction = actions.pop() # type: Action
         for a in actions:
@@ -277,6 +279,7 @@ class Dork(Player):
 
     def simple_choice(self):
         actions = self.get_legal_moves(self.heuristic)
+        score_actions(actions)
         best_action = None  # type: Action
         for a in actions:
             if best_action is None:
@@ -284,7 +287,6 @@ class Dork(Player):
             elif a.heuristic > best_action.heuristic:
                 best_action = a
         if best_action is not None:
-            print(best_action.name)
             best_action.do_action()
         """
         for a in actions:
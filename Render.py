@@ -0,0 +1,153 @@
+from Board import Board
+from Player import Dork
+from Player import LogToAction
+from API import API
+from API import RenderSink
+from Events import EventBus
+from Events import Sink
+from Events import TurnStarted
+from Events import ActionApplied
+from Events import DiceThrown
+from Events import TurnEnded
+from Auxilary import s2r
+from Log import read_game
+from Frames import FrameContainer
+from Frames import merge_containers
+from Frames import FRAMES_DIR
+from multiprocessing import Pool
+import os
+
+# ---- global variables ---- #
+
+DESSERT = 7
+# the actions the game log has enough data to play again (see LogToAction)
+REPLAYABLE = {'trade', 'build free road', 'build road', 'build settlement', 'build first settlement',
+              'build second settlement', 'build city'}
+
+
+# ---- replay ---- #
+
+
+# the events of every turn, in order
+class TurnRecorder(Sink):
+    def __init__(self):
+        self.turns = []  # type: list[list]
+
+    def turn_started(self, event):
+        self.turns += [[event]]
+
+    def dice_thrown(self, event):
+        self.turns[-1] += [event]
+
+    def action_applied(self, event):
+        self.turns[-1] += [event]
+
+    def resources_changed(self, event):
+        self.turns[-1] += [event]
+
+    def turn_ended(self, event):
+        self.turns[-1] += [event]
+
+
+# what a renderer needs to draw a position from scratch: the pieces on the board and the resources of every player
+def checkpoint(board: Board):
+    crossroads = []
+    for cr in board.crossroad_list:
+        if cr.ownership is not None:
+            crossroads += [(cr.ownership, cr.location[0], cr.location[1], cr.building)]
+    roads = []
+    for road in board.road_list:
+        if road.owner is not None:
+            (i0, j0), (i1, j1) = road.neighbors[0].location, road.neighbors[1].location
+            roads += [(road.owner, i0, j0, i1, j1)]
+    resources = [dict(hand.resources.items()) for hand in board.hands]
+    return {'crossroads': crossroads, 'roads': roads, 'resources': resources}
+
+
+# play a saved game (the nested log of Log.read_game) again without rendering, and return the names of the players, the
+# map and for every turn the position at its start and its events. the log only has the dice sum and does not have
+# the development card actions, so the dice are split evenly and the resources of the player are set from the log at
+# the start of each turn
+def replay(game_log):
+    players = game_log['number of players']
+    board = Board(players, None)
+    board.load_map(list(game_log['board']))
+    recorder = TurnRecorder()
+    board.events = EventBus([recorder])
+    hands = [Dork(i, board) for i in range(players)]
+    names = board.get_names()
+    checkpoints = []
+    for r, rnd in enumerate(game_log['rounds']):
+        for turn in rnd['turns']:
+            # in the opening the second settlements go in reverse order, the actions tell whose turn it is
+            player = hands[turn['actions'][0]['player'] if turn['actions'] else turn['turn']]
+            for resource, amount in turn.get('resources', {}).items():
+                player.hand.resources[s2r(resource)] = amount
+            checkpoints += [checkpoint(board)]
+            board.events.publish(TurnStarted(rnd['round'], turn['turn'], player.index, player.name,
+                                             dict(player.hand.resources.items())))
+            if 'dice' in turn:
+                total = turn['dice']
+                if total != DESSERT:
+                    for i, j in board.dice.load(total):
+                        board.map[i][j].produce()
+                board.events.publish(DiceThrown((total + 1) // 2, total // 2, total,
+                                                [dict(hand.resources.items()) for hand in board.hands]))
+            for action_log in turn['actions']:
+                hand = hands[action_log['player']].hand
+                if action_log['name'] in REPLAYABLE:
+                    LogToAction(board, hands[action_log['player']], action_log).get_action().do_action()
+                else:
+                    board.events.publish(ActionApplied(action_log['name'], hand.index, action_log,
+                                                       dict(hand.resources.items()), [], [], False))
+            board.events.publish(TurnEnded(rnd['round'], turn['turn']))
+            board.next_turn(turn['turn'], r)
+    return names, game_log['board'], list(zip(checkpoints, recorder.turns))
+
+
+# ---- rendering ---- #
+
+
+class Land:
+    def __init__(self, resource, num):
+        self.resource = resource
+        self.num = num
+
+
+def lands(board_log):
+    rows = {}
+    for terrain in board_log:
+        rows.setdefault(terrain['i'], {})[terrain['j']] = Land(s2r(terrain['resource']), terrain['number'])
+    return [[rows[i][j] for j in sorted(rows[i])] for i in sorted(rows)]
+
+
+# draw the frames of consecutive turns into their own container, starting from the checkpoint of the first one
+def render_turns(job):
+    names, board_log, turns, part = job
+    api = API(names, save_frames=False, frames=FrameContainer(part))
+    api.show_terrain(lands(board_log))
+    api.draw_position(turns[0][0])
+    api.save_frames = True
+    sink = RenderSink(api)
+    for _, events in turns:
+        for event in events:
+            getattr(sink, event.handler)(event)
+    sink.close()
+    return len(turns)
+
+
+# render a saved game on every core into one frame container (by default named like the game log). the turns are
+# split in one contiguous chunk per process, each process starts its chunk from the recorded checkpoint and writes it
+# to a part container, and the parts are appended in order at the end
+def render_game(path, processes=None, out=None):
+    game_log = read_game(path)
+    names, board_log, turns = replay(game_log)
+    processes = processes or os.cpu_count()
+    size = max(1, -(-len(turns) // processes))
+    out = out or os.path.join(FRAMES_DIR, os.path.splitext(os.path.basename(path))[0])
+    jobs = [(names, board_log, turns[i:i + size], out + '.part' + str(k))
+            for k, i in enumerate(range(0, len(turns), size))]
+    with Pool(processes) as pool:
+        rendered = sum(pool.map(render_turns, jobs))
+    merge_containers([job[3] for job in jobs], out)
+    return rendered
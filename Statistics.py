@@ -0,0 +1,230 @@
+from Keys import bucket_text
+from Keys import BUCKET_SEPARATOR
+import json
+import math
+import os
+import sqlite3
+
+# ---- global variables ---- #
+
+STATISTICS_DB = 'statistics.db'
+STATISTICS_JSON = 'statistics.json'  # the old statistics trie, migrated into a new store
+ESSENTIALS_DEPTH = 3  # Action.create_keys: name, points and player, the deeper trie nodes are regular keys
+TIMEOUT = 30
+SEPARATOR = '\x1f'
+CAPACITY = 200000  # regular rows kept by the store, None for no limit
+LOW_WATER = 0.9  # an eviction brings the regular rows down to this part of the capacity
+MAX_BUCKET = 64  # the widest bucket a numeric regular key folds into, wider ones fold into '*'
+EVICTION_PASSES = 8
+ANY = '*'
+
+
+# ---- functions ---- #
+
+
+# a statistics row is named by the tuple of essential keys and the regular key ('' for the essential node itself)
+def row_key(essentials, regular=None):
+    return SEPARATOR.join(essentials), regular if regular is not None else ''
+
+
+# the bucket above a regular key: an exact number is in the aligned bucket of width 2, a bucket in the aligned bucket
+# twice as wide, and a key too wide or not numeric in 'label : *'. None for 'label : *'
+def parent_regular(regular):
+    label, _, value = regular.rpartition(' : ')
+    if value == ANY:
+        return None
+    try:
+        if BUCKET_SEPARATOR in value:
+            low, high = value.split(BUCKET_SEPARATOR)
+            low, width = float(low), 2 * (float(high) - float(low))
+        else:
+            low, width = float(value), 2
+    except ValueError:
+        return label + ' : ' + ANY
+    if width > MAX_BUCKET:
+        return label + ' : ' + ANY
+    return label + ' : ' + bucket_text(math.floor(low / width) * width, width)
+
+
+def star(regular):
+    label, _, value = regular.rpartition(' : ')
+    return label + ' : ' + ANY if value != ANY else None
+
+
+# ---- classes ---- #
+
+
+# the win statistics of the actions as two flat tables indexed by (essential keys, regular key): the events and wins
+# of every node and how many actions before a point it was seen. a lookup reads only the rows it asks for (and keeps
+# them until the next upsert), so opening the store does not depend on its size. the database runs in WAL mode, so
+# readers do not wait for a writer, and the upserts of a batch are one transaction. a read only store is for workers
+# that must not change the statistics. past capacity regular rows, the least observed regular rows are folded into
+# a bucket above them (see parent_regular and evict), so the totals of every feature stay the same, and a key that is
+# not in the store any more is read from the row it was folded into
+class StatisticsStore:
+    def __init__(self, path=STATISTICS_DB, readonly=False, migrate_from=STATISTICS_JSON, capacity=CAPACITY):
+        self.path = path
+        self.readonly = readonly
+        self.capacity = capacity
+        self.pid = os.getpid()
+        self.rows = {}  # type: dict[tuple, tuple[int, int]]  by (essentials, regular) as given
+        self.to_point = {}  # type: dict[tuple, dict[int, int]]
+        if readonly:
+            self.connection = sqlite3.connect('file:%s?mode=ro' % path, uri=True, timeout=TIMEOUT)
+            return
+        new = not os.path.exists(path)
+        self.connection = sqlite3.connect(path, timeout=TIMEOUT)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS events (essentials TEXT, regular TEXT, events INTEGER, '
+                                    'wins INTEGER, PRIMARY KEY (essentials, regular)) WITHOUT ROWID')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS actions_to_point (essentials TEXT, regular TEXT, '
+                                    'actions INTEGER, count INTEGER, PRIMARY KEY (essentials, regular, actions)) '
+                                    'WITHOUT ROWID')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS folds (essentials TEXT, regular TEXT, parent TEXT, '
+                                    'PRIMARY KEY (essentials, regular)) WITHOUT ROWID')
+        if new and migrate_from and os.path.exists(migrate_from):
+            self.migrate(migrate_from)
+
+    # the events and wins of a node, None if it was never seen
+    def events(self, essentials, regular=None):
+        key = (essentials, regular)
+        if key not in self.rows:
+            row = self.connection.execute('SELECT events, wins FROM events WHERE essentials = ? AND regular = ?',
+                                          row_key(essentials, regular)).fetchone()
+            if row is None and regular is not None and self.folded_into(essentials, regular) is not None:
+                row = self.events(essentials, self.folded_into(essentials, regular))
+            self.rows[key] = row
+        return self.rows[key]
+
+    # how many times the node was seen the number of actions before a point
+    def actions_to_point(self, essentials, regular=None) -> dict[int, int]:
+        key = (essentials, regular)
+        if key not in self.to_point:
+            counts = dict(self.connection.execute('SELECT actions, count FROM actions_to_point WHERE essentials = ? '
+                                                  'AND regular = ?', row_key(essentials, regular)).fetchall())
+            if not counts and regular is not None and self.folded_into(essentials, regular) is not None:
+                counts = self.actions_to_point(essentials, self.folded_into(essentials, regular))
+            self.to_point[key] = counts
+        return self.to_point[key]
+
+    # add counters in one transaction. events maps (essentials, regular) to (events, wins), actions_to_point maps it
+    # to {actions: count}
+    def upsert(self, events, actions_to_point):
+        assert not self.readonly
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO events VALUES (?, ?, ?, ?) ON CONFLICT (essentials, regular) DO UPDATE SET '
+                'events = events + excluded.events, wins = wins + excluded.wins',
+                [row_key(essentials, regular) + (e, w) for (essentials, regular), (e, w) in events.items()])
+            self.connection.executemany(
+                'INSERT INTO actions_to_point VALUES (?, ?, ?, ?) ON CONFLICT (essentials, regular, actions) '
+                'DO UPDATE SET count = count + excluded.count',
+                [row_key(essentials, regular) + (int(actions), count)
+                 for (essentials, regular), counters in actions_to_point.items()
+                 for actions, count in counters.items()])
+            if self.capacity is not None:
+                self.evict()
+        self.rows.clear()
+        self.to_point.clear()
+
+    def regular_rows(self):
+        return self.connection.execute("SELECT COUNT(*) FROM events WHERE regular != ''").fetchone()[0]
+
+    def exists(self, essentials, regular):
+        return self.connection.execute('SELECT 1 FROM events WHERE essentials = ? AND regular = ?',
+                                       (essentials, regular)).fetchone() is not None
+
+    # fold the least observed regular rows away until the store is back under LOW_WATER of its capacity. a row folds
+    # into its nearest ancestor bucket that is already stored. rows without one only fold when that lowers the count:
+    # two or more rows with the same new parent fold into it, then two or more with the same new 'label : *'. the
+    # other rows stay, and the buckets created by an eviction are not evicted by it
+    def evict(self):
+        rows = self.regular_rows()
+        if rows <= self.capacity:
+            return 0
+        target = int(self.capacity * LOW_WATER)
+        created = set()
+        evicted = 0
+        for _ in range(EVICTION_PASSES):
+            if rows <= target:
+                break
+            candidates = [row for row in self.connection.execute(
+                "SELECT essentials, regular FROM events WHERE regular != '' AND regular NOT LIKE ? ORDER BY events "
+                "LIMIT ?", ('%: ' + ANY, rows - target + len(created))).fetchall() if row not in created]
+            folded = 0
+            orphans = []
+            for essentials, regular in candidates[:rows - target]:
+                ancestor = parent_regular(regular)
+                while ancestor is not None and not self.exists(essentials, ancestor):
+                    ancestor = parent_regular(ancestor)
+                if ancestor is not None:
+                    self.fold(essentials, regular, ancestor)
+                    folded += 1
+                else:
+                    orphans += [(essentials, regular)]
+            for new_parent in (parent_regular, star):
+                groups = {}
+                for essentials, regular in orphans:
+                    parent = new_parent(regular)
+                    groups.setdefault((essentials, parent), []).append((essentials, regular))
+                orphans = []
+                for (essentials, parent), group in groups.items():
+                    if parent is not None and len(group) > 1:
+                        for _, regular in group:
+                            self.fold(essentials, regular, parent)
+                        created.add((essentials, parent))
+                        folded += len(group)
+                    else:
+                        orphans += group
+            if not folded:
+                break
+            evicted += folded
+            rows = self.regular_rows()
+        return evicted
+
+    # move the counters of a regular row to another one, and remember where it went for the lookups
+    def fold(self, essentials, regular, parent):
+        execute = self.connection.execute
+        events, wins = execute('SELECT events, wins FROM events WHERE essentials = ? AND regular = ?',
+                               (essentials, regular)).fetchone()
+        execute('DELETE FROM events WHERE essentials = ? AND regular = ?', (essentials, regular))
+        execute('INSERT INTO events VALUES (?, ?, ?, ?) ON CONFLICT (essentials, regular) DO UPDATE SET '
+                'events = events + excluded.events, wins = wins + excluded.wins', (essentials, parent, events, wins))
+        counts = execute('SELECT actions, count FROM actions_to_point WHERE essentials = ? AND regular = ?',
+                         (essentials, regular)).fetchall()
+        execute('DELETE FROM actions_to_point WHERE essentials = ? AND regular = ?', (essentials, regular))
+        self.connection.executemany('INSERT INTO actions_to_point VALUES (?, ?, ?, ?) ON CONFLICT (essentials, '
+                                    'regular, actions) DO UPDATE SET count = count + excluded.count',
+                                    [(essentials, parent, actions, count) for actions, count in counts])
+        execute('INSERT OR REPLACE INTO folds VALUES (?, ?, ?)', (essentials, regular, parent))
+
+    # the row a regular key that is not stored was folded into, None if it never was
+    def folded_into(self, essentials, regular):
+        row = self.connection.execute('SELECT parent FROM folds WHERE essentials = ? AND regular = ?',
+                                      row_key(essentials, regular)).fetchone()
+        return row[0] if row is not None else None
+
+    # load the statistics trie of statistics.json
+    def migrate(self, path):
+        with open(path) as json_file:
+            statistics = json.load(json_file)
+        events, actions_to_point = {}, {}
+        nodes = [((), key, node) for key, node in statistics['actions'].items()]
+        while nodes:
+            prefix, key, node = nodes.pop()
+            if len(prefix) < ESSENTIALS_DEPTH:
+                essentials, regular = prefix + (key,), None
+            else:
+                essentials, regular = prefix, key
+            events[(essentials, regular)] = (node['events'], node['wins'])
+            if 'actions to point' in node:
+                actions_to_point[(essentials, regular)] = node['actions to point']
+            if regular is None:
+                nodes += [(essentials, child, value) for child, value in node.items()
+                          if child not in ('events', 'wins', 'actions to point')]
+        self.upsert(events, actions_to_point)
+
+    def close(self):
+        self.connection.close()
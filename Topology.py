@@ -0,0 +1,119 @@
+from Resources import Resource
+from Auxilary import cr_line_len
+from Auxilary import road_line_len
+
+# ---- global variables ---- #
+
+MAP_LINE_LEN = [3, 4, 5, 4, 3]
+
+PORTS = {(0, 0): Resource.WOOD, (1, 0): Resource.WOOD,
+         (0, 1): Resource.DESSERT, (1, 2): Resource.DESSERT,
+         (2, 3): Resource.DESSERT, (3, 4): Resource.DESSERT,
+         (3, 0): Resource.SHEEP, (4, 0): Resource.SHEEP,
+         (5, 5): Resource.DESSERT, (6, 5): Resource.DESSERT,
+         (7, 0): Resource.WHEAT, (8, 0): Resource.WHEAT,
+         (8, 4): Resource.IRON, (9, 3): Resource.IRON,
+         (10, 0): Resource.CLAY, (11, 0): Resource.CLAY,
+         (10, 2): Resource.DESSERT, (11, 1): Resource.DESSERT}
+
+
+# ---- functions ---- #
+
+
+def to_mask(indexes):
+    mask = 0
+    for i in indexes:
+        mask |= 1 << i
+    return mask
+
+
+# the indexes of the set bits of a mask, in increasing order
+def bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# ---- classes ---- #
+
+
+# the static shape of the board as flat index tables. crossroads, roads and terrains are numbered in row major order
+# of board.crossroads, board.roads and board.map. it is computed once per process (see topology below) and shared
+# by every board, which only binds its fresh mutable state to it
+class Topology:
+    def __init__(self):
+        # locations
+        self.cr_locations = tuple((i, j) for i in range(len(cr_line_len)) for j in range(cr_line_len[i]))
+        self.terrain_locations = tuple((i, j) for i in range(len(MAP_LINE_LEN)) for j in range(MAP_LINE_LEN[i]))
+        self.crossroads_num = len(self.cr_locations)
+        self.terrains_num = len(self.terrain_locations)
+        self.roads_num = sum(road_line_len)
+        cr_index = {location: index for index, location in enumerate(self.cr_locations)}
+
+        # ports
+        self.ports = tuple(PORTS.get(location) for location in self.cr_locations)
+
+        # link the terrains to their crossroads and vice versa
+        terrain_crossroads = []
+        cr_terrains = [[] for _ in range(self.crossroads_num)]
+        for t, (i, j) in enumerate(self.terrain_locations):
+            top = 0 if i < 3 else 1
+            bottom = 1 if i < 2 else 0
+            crossroads = [cr_index[(2 * i, j + top)],
+                          cr_index[(2 * i + 1, j)],
+                          cr_index[(2 * i + 1, j + 1)],
+                          cr_index[(2 * i + 2, j)],
+                          cr_index[(2 * i + 2, j + 1)],
+                          cr_index[(2 * i + 3, j + bottom)]]
+            terrain_crossroads += [tuple(crossroads)]
+            for cr in crossroads:
+                cr_terrains[cr] += [t]
+        self.terrain_crossroads = tuple(terrain_crossroads)
+        self.cr_terrains = tuple(tuple(terrains) for terrains in cr_terrains)
+
+        # very convoluted loop to link each road with its vertices crossroads and vice versa
+        road_ends = []
+        cr_neighbors = [[] for _ in range(self.crossroads_num)]
+        cr_roads = [[] for _ in range(self.crossroads_num)]
+        xor = False
+        for i, length in enumerate(road_line_len):
+            up = 0
+            down = 0
+            if i == 5:
+                xor = True
+            for _ in range(length):
+                road = len(road_ends)
+                cr1 = cr_index[(i, up)]
+                cr2 = cr_index[(i + 1, down)]
+                road_ends += [(cr1, cr2)]
+                cr_neighbors[cr1] += [cr2]
+                cr_roads[cr1] += [road]
+                cr_neighbors[cr2] += [cr1]
+                cr_roads[cr2] += [road]
+                if i % 2:
+                    up += 1
+                    down += 1
+                else:
+                    if (up == down) != xor:
+                        down += 1
+                    else:
+                        up += 1
+        self.road_ends = tuple(road_ends)
+        self.cr_neighbors = tuple(tuple(neighbors) for neighbors in cr_neighbors)
+        self.cr_roads = tuple(tuple(roads) for roads in cr_roads)
+
+        # bit masks: bit i of a crossroads mask is crossroad i, bit i of a roads mask is road i
+        self.all_crossroads = (1 << self.crossroads_num) - 1
+        self.all_roads = (1 << self.roads_num) - 1
+        self.cr_neighbor_masks = tuple(to_mask(neighbors) for neighbors in self.cr_neighbors)
+        self.cr_road_masks = tuple(to_mask(roads) for roads in self.cr_roads)
+        self.road_end_masks = tuple(to_mask(ends) for ends in self.road_ends)
+
+    def __setattr__(self, key, value):
+        if key in self.__dict__:
+            raise AttributeError("the board topology is shared by every board and can not be changed")
+        super().__setattr__(key, value)
+
+
+topology = Topology()
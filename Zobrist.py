@@ -0,0 +1,57 @@
+from Topology import Topology
+
+# ---- global variables ---- #
+
+MASK = (1 << 64) - 1
+SEED = 0x5EED_CA7A_0000_0001
+COUNT_TABLE = 32  # counts below this have a precomputed key, bigger ones are derived on the fly
+
+
+# ---- functions ---- #
+
+
+def splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+
+# ---- classes ---- #
+
+
+# the random 64 bit keys of every feature of a game position. the keys only depend on the seed, so the same position
+# gets the same hash in every process
+class ZobristKeys:
+    def __init__(self, players, topology: Topology, resources_num, cards_num):
+        self.state = SEED
+        # [crossroad][player * 2 + level - 1]
+        self.crossroads = [[self.next() for _ in range(players * 2)] for _ in range(topology.crossroads_num)]
+        # [road][player]
+        self.roads = [[self.next() for _ in range(players)] for _ in range(topology.roads_num)]
+        # [terrain]
+        self.bandit = [self.next() for _ in range(topology.terrains_num)]
+        # [player * resources_num + slot][count], [player * cards_num + kind][count], a count of 0 has no key
+        self.resources = [[0] + [self.next() for _ in range(COUNT_TABLE - 1)] for _ in range(players * resources_num)]
+        self.cards = [[0] + [self.next() for _ in range(COUNT_TABLE - 1)] for _ in range(players * cards_num)]
+        # [player]
+        self.to_move = [self.next() for _ in range(players)]
+
+    def next(self):
+        self.state = splitmix64(self.state)
+        return self.state
+
+    @staticmethod
+    def count(keys, count):
+        if 0 <= count < COUNT_TABLE:
+            return keys[count]
+        return splitmix64(keys[1] ^ (count & MASK))
+
+
+keys_cache = {}
+
+
+def zobrist_keys(players, topology: Topology, resources_num, cards_num) -> ZobristKeys:
+    if players not in keys_cache:
+        keys_cache[players] = ZobristKeys(players, topology, resources_num, cards_num)
+    return keys_cache[players]